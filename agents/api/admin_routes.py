@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException
+from utils.auth import get_current_user
+from utils.profiling import is_admin, list_profiles, profile_file
+from utils import prompt_cache
+from travel_common import slow_ops
+
+router = APIRouter(prefix="/api/admin", tags=["Admin"])
+
+async def get_admin_user(user_id: str = Depends(get_current_user)):
+    if not is_admin(user_id):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user_id
+
+@router.get("/profiles")
+async def get_profiles(user_id: str = Depends(get_admin_user)):
+    """
+    List retained request profiles, slowest first, with per-stage timings.
+    """
+    return list_profiles()
+
+@router.get("/profiles/{request_id}")
+async def download_profile(request_id: str, user_id: str = Depends(get_admin_user)):
+    """
+    Download a profile in speedscope format (open at https://www.speedscope.app).
+    """
+    return profile_file(request_id)
+
+@router.get("/prompt-cache")
+async def get_prompt_cache_report(user_id: str = Depends(get_admin_user)):
+    """
+    Per-agent prompt token accounting: tokens per layer and the share a prefix cache could reuse.
+    """
+    return prompt_cache.report.snapshot()
+
+@router.get("/slow-ops")
+async def get_slow_ops(collscan_only: bool = False, user_id: str = Depends(get_admin_user)):
+    """
+    Mongo operations grouped by query shape, with latency stats and the explained plan of slow shapes.
+    """
+    return slow_ops.listener.report(collscan_only)
@@ -1,8 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
-from schema.schemas import ChatRequest, ChatResponse, ConfirmationRequest, UserLogin, Token
+from fastapi.responses import StreamingResponse
+from schema.schemas import ChatRequest, ChatResponse, ConfirmationRequest, UserLogin, Token, BatchChatRequest
 from utils.auth import get_current_user
+from utils.admission import admit_user, admission
 from service.agent_service import process_chat, confirm_booking
 from service.user_service import authenticate_user, create_access_token
+from service.batch_service import run_batch, MAX_BATCH_ITEMS
+import json
 from typing import Dict
 
 router = APIRouter(prefix="/api", tags=["Travel Agent"])
@@ -20,7 +24,7 @@ async def login_for_access_token(form_data: UserLogin):
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/chat/", response_model=ChatResponse)
-async def chat(request: ChatRequest, user_id: str = Depends(get_current_user)):
+async def chat(request: ChatRequest, user_id: str = Depends(admit_user)):
     """
     Chat endpoint to interact with flight or hotel booking agents.
     Requires Bearer token in Authorization header: `Bearer <token>`.
@@ -30,13 +34,38 @@ async def chat(request: ChatRequest, user_id: str = Depends(get_current_user)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/chat/batch")
+async def chat_batch(request: BatchChatRequest, user_id: str = Depends(get_current_user)):
+    """
+    Run many chat messages through the agents with bounded concurrency.
+    Identical messages run once; results stream back as NDJSON in completion order.
+    Each run is admitted separately; rate-limited or shed items carry `status_code` and `retry_after`.
+    Set `skip_memory` to keep bulk runs out of the conversation store.
+    """
+    if len(request.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_ITEMS} items per batch")
+    async def results():
+        async for result in run_batch(request.items, user_id, request.concurrency, request.skip_memory):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
 @router.post("/confirm/", response_model=ChatResponse)
-async def confirm(request: ConfirmationRequest, user_id: str = Depends(get_current_user)):
+async def confirm(request: ConfirmationRequest, user_id: str = Depends(admit_user)):
     """
     Confirm booking endpoint for flight or hotel bookings.
     Requires Bearer token in Authorization header: `Bearer <token>`.
     """
     try:
         return await confirm_booking(request, user_id)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/admission/metrics")
+async def admission_metrics(user_id: str = Depends(get_current_user)):
+    """
+    Admitted versus shed request counts for the chat endpoints in this worker.
+    """
+    return admission.snapshot()
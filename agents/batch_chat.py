@@ -0,0 +1,51 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+from schema.schemas import BatchChatItem
+from service.agent_service import hotel_index
+from service.batch_service import run_batch
+from service.db_service import get_database
+from utils.entities import extractor
+
+# Offline counterpart of POST /api/chat/batch: runs an NDJSON file of
+# {"id": ..., "message": ..., "session_id": ...} lines through the agent graph
+# in-process and writes one NDJSON result per line as each finishes.
+#
+#   python batch_chat.py eval.ndjson --user-id eval --concurrency 8 --skip-memory > results.ndjson
+
+def read_items(path: str):
+    with (sys.stdin if path == "-" else open(path)) as f:
+        return [BatchChatItem(**json.loads(line)) for line in f if line.strip()]
+
+async def main(args):
+    items = read_items(args.input)
+    # The API fills these at startup; without them entity extraction and hotel search come up empty
+    db = await get_database()
+    await extractor.load_gazetteer(db)
+    async for hotel in db.hotels.find():
+        hotel_index.upsert(hotel)
+    out = open(args.output, "w") if args.output else sys.stdout
+    start = time.perf_counter()
+    done = failed = 0
+    try:
+        async for result in run_batch(items, args.user_id, args.concurrency, args.skip_memory, admit=False):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            done += 1
+            failed += "error" in result
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    print(f"{done} results ({failed} failed) in {elapsed:.1f}s, {done / elapsed if elapsed else 0:.1f}/s", file=sys.stderr)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run an NDJSON file of chat messages through the travel agents")
+    parser.add_argument("input", help="NDJSON file of messages, or - for stdin")
+    parser.add_argument("-o", "--output", help="write results here instead of stdout")
+    parser.add_argument("--user-id", default="batch", help="user id recorded on the runs")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--skip-memory", action="store_true", help="do not write turns to the conversation store")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,58 @@
+import json
+import time
+from datetime import datetime
+from utils.entities import EntityExtractor
+
+# Accuracy and throughput of the pre-LLM entity extractor against the
+# labelled messages in entity_corpus.jsonl. Uses the seed gazetteer only,
+# so it runs without MongoDB.
+
+CORPUS = "entity_corpus.jsonl"
+FIELDS = ["airports", "cities", "origin", "destination", "dates", "nights", "passengers", "budget", "intent"]
+ITERATIONS = 200
+
+def as_items(field, value):
+    if value is None:
+        return set()
+    if isinstance(value, list):
+        return {(field, item) for item in value}
+    return {(field, value)}
+
+def main():
+    with open(CORPUS) as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+    extractor = EntityExtractor()
+
+    counts = {field: {"tp": 0, "fp": 0, "fn": 0} for field in FIELDS}
+    for example in corpus:
+        predicted = extractor.extract(example["message"], datetime.fromisoformat(example["anchor"]))
+        for field in FIELDS:
+            got = as_items(field, predicted[field])
+            want = as_items(field, example["expected"][field])
+            counts[field]["tp"] += len(got & want)
+            counts[field]["fp"] += len(got - want)
+            counts[field]["fn"] += len(want - got)
+            if got != want:
+                print(f"  miss {field}: {example['message']!r} got {predicted[field]!r}")
+
+    print(f"\n{'field':<12}{'precision':>10}{'recall':>10}")
+    total = {"tp": 0, "fp": 0, "fn": 0}
+    for field, count in counts.items():
+        for key in total:
+            total[key] += count[key]
+        precision = count["tp"] / (count["tp"] + count["fp"]) if count["tp"] + count["fp"] else 1.0
+        recall = count["tp"] / (count["tp"] + count["fn"]) if count["tp"] + count["fn"] else 1.0
+        print(f"{field:<12}{precision:>10.3f}{recall:>10.3f}")
+    print(f"{'overall':<12}{total['tp'] / (total['tp'] + total['fp']):>10.3f}{total['tp'] / (total['tp'] + total['fn']):>10.3f}")
+
+    messages = [(example["message"], datetime.fromisoformat(example["anchor"])) for example in corpus]
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        for message, anchor in messages:
+            extractor.extract(message, anchor)
+    elapsed = time.perf_counter() - start
+    extracted = ITERATIONS * len(messages)
+    print(f"\n{extracted} extractions in {elapsed:.3f}s: {elapsed / extracted * 1e6:.1f} us/message, {extracted / elapsed:.0f} messages/s")
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,15 @@ from fastapi import FastAPI, Security
 from fastapi.security import OAuth2PasswordBearer, HTTPAuthorizationCredentials, HTTPBearer
 from api.routes import router as travel_router
 from api.user_routes import router as user_router
+from api.admin_routes import router as admin_router
+from service.db_service import ensure_indexes, get_database, get_client
+from service.agent_service import hotel_index
+from service.travel_api import travel_api
+from travel_common.hotel_index import maintain_index
+from travel_common import slow_ops
+from travel_common.tasks import start_background
+from utils.entities import extractor
+from utils.profiling import PROFILING_ENABLED, profiling_middleware
 import uvicorn
 import os
 
@@ -16,6 +25,23 @@ security = HTTPBearer()
 # Include API routes
 app.include_router(travel_router)
 app.include_router(user_router)
+app.include_router(admin_router)
+
+# Opt-in request profiling for admin tokens
+if PROFILING_ENABLED:
+    app.middleware("http")(profiling_middleware)
+
+@app.on_event("startup")
+async def startup():
+    slow_ops.listener.bind(await get_client())
+    await ensure_indexes()
+    await extractor.load_gazetteer(await get_database())
+    start_background(maintain_index(await get_database(), hotel_index), "hotel index")
+
+@app.on_event("shutdown")
+async def shutdown():
+    if travel_api:
+        await travel_api.close()
 
 # Optional: Add global security requirement (uncomment to enforce on all endpoints)
 # app.add_middleware(
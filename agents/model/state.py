@@ -1,10 +1,18 @@
 from typing import TypedDict, List, Dict, Optional
 from typing_extensions import Annotated
 
+def merge_trip_results(left: Dict, right: Dict) -> Dict:
+    # Parallel trip branches each add their own key; an empty update starts a new turn
+    return {**left, **right} if right else {}
+
 class AgentState(TypedDict):
     user_id: str
     messages: Annotated[List[Dict], "List of chat messages"]
     context: Annotated[Dict, "Context from vector store"]
+    entities: Annotated[Dict, "Airports, cities, dates, counts and budget extracted from the message"]
     requires_confirmation: bool
     confirmation_data: Optional[Dict]
-    agent_type: str
\ No newline at end of file
+    last_confirmation_nonce: Optional[str]
+    agent_type: str
+    trip_results: Annotated[Dict, merge_trip_results]
+    skip_memory: bool
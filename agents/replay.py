@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+# Replays a trace of chat/confirm turns through process_chat/confirm_booking
+# with LLM output and history searches served from a cassette and Mongo
+# restored from a fixture snapshot, then reports graph nodes, LLM calls,
+# prompt sizes and per-stage timings per turn.
+#
+# Trace lines:
+#   {"type": "chat", "message": "...", "session_id": "s1", "now": "2025-07-30T10:00:00"}
+#   {"type": "confirm", "session_id": "s1", "confirmed": true}
+#
+# Both modes run the trace against a scratch MONGODB_DATABASE, never the live one.
+# Record against live LLM/Chroma, snapshotting the live database (read-only) and
+# restoring that snapshot into the scratch database first:
+#   MONGODB_DATABASE=travel_booking_replay python replay.py trace.jsonl --record \
+#       --cassette trace.cassette.json --fixtures trace.fixtures.json
+# Replay and compare with a previous report, failing on regressions:
+#   MONGODB_DATABASE=travel_booking_replay python replay.py trace.jsonl --cassette ... --fixtures ... \
+#       --report new.json --baseline old.json
+
+DEFAULT_NOW = "2025-07-30T10:00:00"
+USER_ID = "replay"
+
+
+async def prepare(args, cassette):
+    from service import agent_service
+    from service.db_service import get_database, get_client
+    from utils.cassette import CassetteLLM, CassetteVectorStore
+    from utils.entities import extractor
+    from utils import fixtures
+
+    db = await get_database()
+    if args.record:
+        await fixtures.snapshot((await get_client())[args.source_database], args.fixtures)
+    await fixtures.restore(db, args.fixtures)
+
+    for agent_type, agent in agent_service.agents.items():
+        agent.llm = CassetteLLM(agent_type, agent.llm, cassette)
+    agent_service.vectorstore = CassetteVectorStore(agent_service.vectorstore, cassette)
+    # Replays read the restored fixtures, never a live demo_api that DEMO_API_URL may point at
+    agent_service.travel_api = None
+
+    await extractor.load_gazetteer(db)
+    async for hotel in db.hotels.find():
+        agent_service.hotel_index.upsert(hotel)
+    return agent_service
+
+
+async def run_turn(agent_service, cassette, turn: dict) -> dict:
+    from schema.schemas import ChatRequest, ConfirmationRequest
+    from utils.profiling import collect_stages
+
+    start = time.perf_counter()
+    with collect_stages() as stages:
+        try:
+            if turn["type"] == "chat":
+                response = await agent_service.process_chat(
+                    ChatRequest(message=turn["message"], session_id=turn["session_id"]),
+                    USER_ID,
+                    now=datetime.fromisoformat(turn.get("now", DEFAULT_NOW))
+                )
+            else:
+                state = agent_service.graph.get_state({"configurable": {"thread_id": turn["session_id"]}}).values
+                response = await agent_service.confirm_booking(
+                    ConfirmationRequest(
+                        session_id=turn["session_id"],
+                        confirmed=turn.get("confirmed", True),
+                        nonce=(state.get("confirmation_data") or {}).get("nonce")
+                    ),
+                    USER_ID
+                )
+            error = None
+        except Exception as e:
+            response, error = None, f"{type(e).__name__}: {e}"
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    calls = cassette.take_calls()
+    timings = {}
+    for entry in stages:
+        timings[entry["stage"]] = round(timings.get(entry["stage"], 0) + entry["duration_ms"], 3)
+    return {
+        "type": turn["type"],
+        "session_id": turn["session_id"],
+        "message": turn.get("message"),
+        "error": error,
+        "requires_confirmation": response.requires_confirmation if response else None,
+        "nodes": [entry["stage"][len("node."):] for entry in stages if entry["stage"].startswith("node.")],
+        "llm_calls": len(calls),
+        "prompt_chars": sum(call["prompt_chars"] for call in calls),
+        "prompt_tokens": sum(call["prompt_tokens"] for call in calls),
+        "elapsed_ms": round(elapsed_ms, 3),
+        "stages_ms": timings,
+    }
+
+
+def compare(report: list, baseline: list, tolerance: float) -> list:
+    """Regressions in graph shape or prompt size against a baseline report; timings are informational."""
+    problems = []
+    for i, (new, old) in enumerate(zip(report, baseline)):
+        label = f"turn {i} ({new['type']} {new['session_id']})"
+        if new["error"] and not old["error"]:
+            problems.append(f"{label}: now fails with {new['error']}")
+        if len(new["nodes"]) > len(old["nodes"]):
+            problems.append(f"{label}: {len(old['nodes'])} -> {len(new['nodes'])} graph nodes")
+        if new["llm_calls"] > old["llm_calls"]:
+            problems.append(f"{label}: {old['llm_calls']} -> {new['llm_calls']} LLM calls")
+        if old["prompt_tokens"] and new["prompt_tokens"] > old["prompt_tokens"] * (1 + tolerance):
+            problems.append(f"{label}: prompt grew {old['prompt_tokens']} -> {new['prompt_tokens']} tokens")
+    if len(report) != len(baseline):
+        problems.append(f"trace length changed: {len(baseline)} -> {len(report)} turns")
+    return problems
+
+
+async def main(args):
+    from utils.cassette import Cassette
+
+    with open(args.trace) as f:
+        turns = [json.loads(line) for line in f if line.strip()]
+    cassette = Cassette(args.cassette, "record" if args.record else "replay")
+    agent_service = await prepare(args, cassette)
+
+    report = []
+    for turn in turns:
+        result = await run_turn(agent_service, cassette, turn)
+        report.append(result)
+        print(
+            f"{result['type']:<8}{result['session_id']:<12}nodes={len(result['nodes'])} "
+            f"llm={result['llm_calls']} prompt_tokens={result['prompt_tokens']} {result['elapsed_ms']:.1f}ms"
+            + (f"  ERROR {result['error']}" if result["error"] else ""),
+            file=sys.stderr
+        )
+    cassette.save()
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}", file=sys.stderr)
+        return 1 if problems else 0
+    return 1 if any(result["error"] for result in report) else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a chat trace deterministically and report graph performance")
+    parser.add_argument("trace", help="JSONL trace of chat/confirm turns")
+    parser.add_argument("--cassette", required=True, help="recorded LLM completions and history searches")
+    parser.add_argument("--fixtures", required=True, help="Mongo snapshot restored before replaying")
+    parser.add_argument("--record", action="store_true", help="call live services and write the cassette and fixtures")
+    parser.add_argument("--report", help="write the per-turn report as JSON")
+    parser.add_argument("--baseline", help="previous report to compare against; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="allowed relative prompt growth")
+    parser.add_argument("--source-database", default="travel_booking", help="live database snapshotted by --record")
+    args = parser.parse_args()
+    # Confirm turns book and decrement inventory; keep them off the live database in both modes
+    if os.getenv("MONGODB_DATABASE", "travel_booking") in ("travel_booking", args.source_database):
+        parser.error("the trace writes to the target database; set MONGODB_DATABASE to a scratch database")
+    sys.exit(asyncio.run(main(args)))
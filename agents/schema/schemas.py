@@ -11,10 +11,21 @@ class ChatResponse(BaseModel):
     requires_confirmation: bool = False
     confirmation_data: Optional[Dict] = None
 
+class BatchChatItem(BaseModel):
+    id: Optional[str] = None
+    message: str
+    session_id: Optional[str] = None
+
+class BatchChatRequest(BaseModel):
+    items: List[BatchChatItem]
+    concurrency: int = 4
+    skip_memory: bool = False
+
 class ConfirmationRequest(BaseModel):
     session_id: str
     confirmed: bool
     confirmation_data: Optional[Dict] = None
+    nonce: Optional[str] = None
 
 class UserLogin(BaseModel):
     username: str
@@ -1,47 +1,92 @@
-from langgraph.graph import StateGraph, END
-from langchain_core.prompts import ChatPromptTemplate
+from langgraph.graph import StateGraph, START, END
 from langchain_groq import ChatGroq
 from langchain_community.vectorstores import Chroma
 from chromadb.utils import embedding_functions
 from model.state import AgentState
-from service.db_service import get_database
-from datetime import datetime
+from service.db_service import get_database, get_client
+from service.travel_api import travel_api
+from utils.profiling import stage
+from travel_common.hotel_index import HotelIndex
+from utils.entities import extractor
+from utils import prompt_cache
+from travel_common import availability, inventory as shard_inventory
+from datetime import datetime, timedelta
+from typing import Dict
 import os
 from langgraph.checkpoint.memory import MemorySaver
 import uuid
+from bson import ObjectId
 from schema.schemas import ChatResponse
-from fastapi import Depends, HTTPException
+from fastapi import HTTPException
+import asyncio
+import httpx
+import logging
+import re
+
+logger = logging.getLogger(__name__)
 
 CHROMA_PERSIST_DIR = "./chroma_db"
 # GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GROQ_API_KEY=""
+hotel_index = HotelIndex()
 vectorstore = Chroma(persist_directory=CHROMA_PERSIST_DIR, embedding_function=embedding_functions.DefaultEmbeddingFunction())
 
 
+def requested_stay(entities: Dict):
+    """(check-in, nights) from the extracted dates and night count, or None without a date."""
+    if not entities.get("dates"):
+        return None
+    check_in = datetime.fromisoformat(entities["dates"][0])
+    nights = entities.get("nights") or (
+        availability.stay_nights(check_in, datetime.fromisoformat(entities["dates"][1]))
+        if len(entities["dates"]) > 1 else 1
+    )
+    return check_in, nights
+
+
 class TravelAgent:
     def __init__(self, agent_type: str):
         self.agent_type = agent_type
         self.llm = ChatGroq(model="llama3-70b-8192", groq_api_key=GROQ_API_KEY)
-        self.prompt = ChatPromptTemplate.from_template(
-            f"""You are a {agent_type} booking assistant. Use the provided context and user history to assist with {agent_type} bookings.
-            Context: {{context}}
-            User History: {{history}}
-            Current Message: {{message}}
-            
-            Provide accurate information about {agent_type} availability, prices, and booking details.
-            If a booking action is requested, prepare the booking details and request confirmation.
-            For flights, include flight number, airline, departure/arrival times, and price.
-            For hotels, include hotel name, room type, price per night, and available amenities."""
+        # Identical for every call to this agent, so it always leads the prompt
+        self.system_prefix = (
+            f"You are a {agent_type} booking assistant. Use the provided context and user history to assist with {agent_type} bookings.\n"
+            f"Provide accurate information about {agent_type} availability, prices, and booking details.\n"
+            "If a booking action is requested, prepare the booking details and request confirmation.\n"
+            "For flights, include flight number, airline, departure/arrival times, and price.\n"
+            "For hotels, include hotel name, room type, price per night, and available amenities.\n"
         )
 
-    async def process(self, state: AgentState, db):
-        history = vectorstore.similarity_search(state["messages"][-1]["content"], k=5)
+    def build_prompt(self, context: Dict, history: str, message: str) -> list:
+        """Prompt layers from most to least stable; their concatenation is sent to the LLM.
 
-        history_text = "\n".join([doc.page_content for doc in history])
-        
+        The inventory overview doesn't depend on the message; summary rows narrowed to
+        the message go in the tail with the items so they don't break the cached prefix.
+        """
+        inventory = f"Inventory overview: {prompt_cache.stable_json(context['overview'])}\n"
+        relevant = {'items': context['items'], 'summaries': context['summaries'], 'entities': context['entities']}
+        tail = (
+            f"Context: {prompt_cache.stable_json(relevant)}\n"
+            f"User History: {history}\n"
+            f"Current Message: {message}"
+        )
+        return [self.system_prefix, inventory, tail]
+
+    async def fetch_context(self, db, message: str, entities: Dict):
         # Fetch context from MongoDB
         if self.agent_type == "flight":
-            items = await db.flights.find().to_list(100)
+            # Filter on the extracted route and day, widening back to all flights if nothing matches
+            query = {}
+            if entities.get("origin") in entities.get("airports", []):
+                query["departure_airport"] = entities["origin"]
+            if entities.get("destination") in entities.get("airports", []):
+                query["arrival_airport"] = entities["destination"]
+            if entities.get("dates"):
+                day = datetime.fromisoformat(entities["dates"][0])
+                query["departure_time"] = {"$gte": day, "$lt": day + timedelta(days=1)}
+            items = await db.flights.find(query).to_list(100) if query else []
+            if not items:
+                items = await db.flights.find().to_list(100)
             context = {
                 "items": [{
                     "id": str(item["_id"]),
@@ -56,8 +101,53 @@ class TravelAgent:
                     "cabin_class": item["cabin_class"]
                 } for item in items]
             }
+            # Cheapest bookable flight per route per upcoming day, maintained by demo_api:
+            # all routes for the overview, the extracted route for this turn. Seat totals
+            # move with every booking; leaving them out keeps the overview cacheable
+            upcoming = {"date": {"$gte": entities.get("today") or datetime.utcnow().strftime("%Y-%m-%d")}}
+            route = {field: query[field] for field in ("departure_airport", "arrival_airport") if field in query}
+
+            async def route_summaries(summary_query):
+                rows = await db.route_summaries.find(
+                    summary_query, {"_id": 0, "updated_at": 0, "seats_available": 0}
+                ).sort([("date", 1), ("price", 1), ("departure_airport", 1), ("arrival_airport", 1)]).to_list(50)
+                return [{**row, "departure_time": row["departure_time"].isoformat()} for row in rows]
+
+            context["overview"] = await route_summaries(upcoming)
+            context["summaries"] = await route_summaries({**upcoming, **route}) if route else []
         else:  # hotel
-            items = await db.hotels.find().to_list(100)
+            # Narrow to hotels matching the message when the index has any; cities the
+            # extractor recognised (aliases resolved) are a hard filter, not a ranking hint
+            cities = entities.get("cities") or None
+            candidate_ids = hotel_index.search(message, city=cities, max_price=entities.get("budget"), limit=20)
+            items = None
+            if candidate_ids and travel_api:
+                # One batched, cached call to demo_api instead of reading its collection;
+                # if demo_api is down or slow, read the collection after all
+                try:
+                    found = await travel_api.get_many("hotels", candidate_ids)
+                    items = [{**found[hotel_id], "_id": hotel_id} for hotel_id in candidate_ids if hotel_id in found]
+                except httpx.HTTPError as e:
+                    logger.warning("demo_api hotel lookup failed, reading Mongo: %s", e)
+            if items is None and candidate_ids:
+                items = await db.hotels.find({"_id": {"$in": [ObjectId(hotel_id) for hotel_id in candidate_ids]}}).to_list(20)
+                rank = {hotel_id: i for i, hotel_id in enumerate(candidate_ids)}
+                items.sort(key=lambda item: rank[str(item["_id"])])
+            elif items is None:
+                items = await db.hotels.find({"address.city": {"$in": cities}} if cities else {}).to_list(100)
+
+            # For dated stays, keep hotels with a room on every night and report that minimum
+            stay = requested_stay(entities)
+            if stay:
+                check_in, nights = stay
+                try:
+                    free = await availability.rooms_available(
+                        db, check_in, nights, hotel_ids=[str(item["_id"]) for item in items]
+                    )
+                except ValueError:
+                    free = None
+                if free is not None:
+                    items = [{**item, "available_rooms": free[str(item["_id"])]} for item in items if str(item["_id"]) in free]
             context = {
                 "items": [{
                     "id": str(item["_id"]),
@@ -70,81 +160,180 @@ class TravelAgent:
                     "amenities": item["amenities"]
                 } for item in items]
             }
+            # Hotels per city by price band, maintained by demo_api: every city for the
+            # overview, the mentioned cities for this turn
+            async def city_summaries(summary_query):
+                return await db.city_summaries.find(
+                    summary_query, {"_id": 0, "updated_at": 0, "available_rooms": 0}
+                ).sort([("city", 1), ("min_price", 1), ("band", 1)]).to_list(50)
+
+            context["overview"] = await city_summaries({})
+            context["summaries"] = await city_summaries({"city": {"$in": cities}}) if cities else []
+        return context
+
+    async def respond(self, state: AgentState, db) -> Dict:
+        """Answer the latest message without touching state, so trip branches can run side by side."""
+        message = state["messages"][-1]["content"]
+        with stage(f"{self.agent_type}.history_search"):
+            # Chroma is synchronous; keep it off the event loop so parallel branches overlap
+            history = await asyncio.to_thread(vectorstore.similarity_search, message, k=5)
+
+        history_text = "\n".join([doc.page_content for doc in history])
+        
+        with stage(f"{self.agent_type}.context_fetch"):
+            context = await self.fetch_context(db, message, state["entities"])
+            context["entities"] = state["entities"]
         
         # Process user message with LLM
-        response = await self.llm.ainvoke(
-            self.prompt.format(
-                context=context,
-                history=history_text,
-                message=state["messages"][-1]["content"]
-            )
-        )
+        layers = self.build_prompt(context, history_text, message)
+        prompt_cache.report.record(self.agent_type, layers)
+        with stage(f"{self.agent_type}.llm"):
+            response = await self.llm.ainvoke("".join(layers))
         
         # Handle booking requests
-        if "book" in state["messages"][-1]["content"].lower() and context["items"]:
-            state["requires_confirmation"] = True
-            state["confirmation_data"] = {
+        content, confirmation_data = response.content, None
+        if state["entities"].get("intent") == "book" and context["items"]:
+            confirmation_data = {
                 "item_id": context["items"][0]["id"],
                 "price": context["items"][0].get("price", context["items"][0].get("price_per_night")),
-                "details": context["items"][0]
+                "details": context["items"][0],
+                "nonce": uuid.uuid4().hex
             }
-            response.content += "\nPlease confirm your booking with the following details:\n" + str(context["items"][0])
-        
-        # Store conversation in ChromaDB
-        vectorstore.add_texts(
-            texts=[f"User: {state['messages'][-1]['content']}\nAssistant: {response.content}"],
+            # Dated stays are booked against the per-night calendar the rooms were quoted from
+            stay = requested_stay(state["entities"]) if self.agent_type == "hotel" else None
+            if stay:
+                check_in, nights = stay
+                confirmation_data.update({
+                    "price": confirmation_data["price"] * nights,
+                    "check_in_date": check_in.isoformat(),
+                    "check_out_date": (check_in + timedelta(days=nights)).isoformat(),
+                    "nights": nights
+                })
+            content += "\nPlease confirm your booking with the following details:\n" + str(context["items"][0])
+        return {"content": content, "confirmation_data": confirmation_data}
+
+    async def process(self, state: AgentState, db):
+        result = await self.respond(state, db)
+        if result["confirmation_data"]:
+            state["requires_confirmation"] = True
+            state["confirmation_data"] = result["confirmation_data"]
+        await remember(state, result["content"])
+        state["messages"].append({"role": "assistant", "content": result["content"]})
+        return state
+
+async def remember(state: AgentState, content: str):
+    # Store conversation in ChromaDB, unless a bulk run asked not to
+    if state.get("skip_memory"):
+        return
+    with stage("memory_write"):
+        await asyncio.to_thread(
+            vectorstore.add_texts,
+            texts=[f"User: {state['messages'][-1]['content']}\nAssistant: {content}"],
             metadatas=[{"user_id": state["user_id"], "timestamp": datetime.utcnow().isoformat()}]
         )
-        
-        state["messages"].append({"role": "assistant", "content": response.content})
-        return state
 
 # Initialize agents
 flight_agent = TravelAgent("flight")
 hotel_agent = TravelAgent("hotel")
+agents = {"flight": flight_agent, "hotel": hotel_agent}
 
 # LangGraph workflow
 workflow = StateGraph(AgentState)
-async def flight_agent_node(state, db=Depends(get_database)):
-    return await flight_agent.process(state, db)
+async def flight_agent_node(state):
+    with stage("node.flight_agent"):
+        return await flight_agent.process(state, await get_database())
+
+async def hotel_agent_node(state):
+    with stage("node.hotel_agent"):
+        return await hotel_agent.process(state, await get_database())
 
-async def hotel_agent_node(state, db=Depends(get_database)):
-    return await hotel_agent.process(state, db)
+# Trip mode: both branches run in the same superstep and only write their own
+# key of trip_results, which the join node merges into one reply
+async def flight_branch_node(state):
+    with stage("node.flight_branch"):
+        return {"trip_results": {"flight": await flight_agent.respond(state, await get_database())}}
+
+async def hotel_branch_node(state):
+    with stage("node.hotel_branch"):
+        return {"trip_results": {"hotel": await hotel_agent.respond(state, await get_database())}}
+
+async def trip_join_node(state):
+    with stage("node.trip_join"):
+        return await join_trip_results(state)
+
+async def join_trip_results(state):
+    results = state["trip_results"]
+    content = "\n\n".join(
+        f"{kind.capitalize()}:\n{results[kind]['content']}" for kind in ("flight", "hotel") if kind in results
+    )
+    confirmation_data = {
+        kind: results[kind]["confirmation_data"]
+        for kind in ("flight", "hotel") if results.get(kind, {}).get("confirmation_data")
+    }
+    if confirmation_data:
+        # One nonce covers the combined confirmation
+        confirmation_data["nonce"] = uuid.uuid4().hex
+    await remember(state, content)
+    return {
+        "messages": state["messages"] + [{"role": "assistant", "content": content}],
+        "requires_confirmation": bool(confirmation_data),
+        "confirmation_data": confirmation_data or None
+    }
 
 workflow.add_node("flight_agent", flight_agent_node)
 workflow.add_node("hotel_agent", hotel_agent_node)
+workflow.add_node("flight_branch", flight_branch_node)
+workflow.add_node("hotel_branch", hotel_branch_node)
+workflow.add_node("trip_join", trip_join_node)
 
 
 workflow.add_node("human_confirmation", lambda state: state)
 
+def entry_router(state: AgentState):
+    if state["agent_type"] == "trip":
+        return ["flight_branch", "hotel_branch"]
+    return f"{state['agent_type']}_agent"
+
 def router(state: AgentState) -> str:
     if state["requires_confirmation"]:
         return "human_confirmation"
-    return state["agent_type"]
+    return END
 
-workflow.add_conditional_edges(
-    "flight_agent",
-    router,
-    {"flight_agent": "flight_agent", "hotel_agent": "hotel_agent", "human_confirmation": "human_confirmation"}
-)
-workflow.add_conditional_edges(
-    "hotel_agent",
-    router,
-    {"flight_agent": "flight_agent", "hotel_agent": "hotel_agent", "human_confirmation": "human_confirmation"}
-)
+workflow.add_conditional_edges(START, entry_router, ["flight_agent", "hotel_agent", "flight_branch", "hotel_branch"])
+for node in ("flight_agent", "hotel_agent", "trip_join"):
+    workflow.add_conditional_edges(node, router, {"human_confirmation": "human_confirmation", END: END})
+workflow.add_edge(["flight_branch", "hotel_branch"], "trip_join")
 workflow.add_edge("human_confirmation", END)
-workflow.set_entry_point("flight_agent")
 graph = workflow.compile(checkpointer=MemorySaver())
 
-async def process_chat(request, user_id):
+_FLIGHT_WORDS = re.compile(r"\b(flights?|fly|flying|plane|airlines?|tickets?|seats?)\b")
+# A bare "night" or "stay" turns up in flight requests too ("night flight", "stay 2 days");
+# only lodging words or a night count ("3 nights") ask for a hotel
+_HOTEL_WORDS = re.compile(
+    r"\b(hotels?|rooms?|resorts?|suites?|lodging)\b"
+    r"|\b(\d+|one|two|three|four|five|six|seven|eight|nine|ten)\s+nights?\b"
+)
+
+def detect_agent_type(message: str) -> str:
+    lowered = message.lower()
+    wants_flight = bool(_FLIGHT_WORDS.search(lowered))
+    wants_hotel = bool(_HOTEL_WORDS.search(lowered))
+    if wants_flight and wants_hotel:
+        return "trip"
+    return "flight" if wants_flight else "hotel"
+
+async def process_chat(request, user_id, skip_memory: bool = False, now: datetime = None):
     session_id = request.session_id or str(uuid.uuid4())
     state = {
         "user_id": user_id,
         "messages": [{"role": "user", "content": request.message}],
         "context": {},
+        "entities": extractor.extract(request.message, now or datetime.utcnow()),
         "requires_confirmation": False,
         "confirmation_data": None,
-        "agent_type": "flight" if "flight" in request.message.lower() else "hotel"
+        "agent_type": detect_agent_type(request.message),
+        "trip_results": {},
+        "skip_memory": skip_memory
     }
     
     result = await graph.ainvoke(state, config={"configurable": {"thread_id": session_id}})
@@ -156,58 +345,130 @@ async def process_chat(request, user_id):
         confirmation_data=result["confirmation_data"]
     )
 
+# kind -> (inventory collection, stock field, bookings collection, item id field, placeholder contact)
+BOOKING_TARGETS = {
+    "flight": ("flights", "seats_available", "flight_bookings", "flight_id",
+               {"passenger_name": "TBD", "passenger_email": "TBD@example.com"}),
+    "hotel": ("hotels", "available_rooms", "hotel_bookings", "hotel_id",
+              {"guest_name": "TBD", "guest_email": "TBD@example.com"}),
+}
+
 async def confirm_booking(request, user_id):
     from bson import ObjectId
     from datetime import datetime
-    
+    from pymongo.errors import DuplicateKeyError
+
     db = await get_database()
-    state_obj = graph.get_state({"configurable": {"thread_id": request.session_id}})
-    state = state_obj.get_state()
-    
+    client = await get_client()
+    state = graph.get_state({"configurable": {"thread_id": request.session_id}}).values
+
+    # Retries of the same confirmation resolve to the stored result instead of booking twice.
+    # A retry after success finds confirmation_data cleared, so fall back to the consumed nonce.
+    known = [(state.get("confirmation_data") or {}).get("nonce"), state.get("last_confirmation_nonce")]
+    if request.nonce and request.nonce not in known:
+        # A nonce from another prompt (or made up) must not book the pending one
+        raise HTTPException(status_code=409, detail="Confirmation nonce does not match the pending booking")
+    nonce = request.nonce or known[0] or known[1]
+    idempotency_key = f"{request.session_id}:{nonce}"
+    cached = await db.booking_confirmations.find_one({"_id": idempotency_key, "user_id": user_id})
+    if cached:
+        return ChatResponse(**cached["response"])
+
     if not state.get("requires_confirmation"):
         raise HTTPException(status_code=400, detail="No confirmation required")
-    
-    if request.confirmed:
-        if state["agent_type"] == "flight":
-            booking_data = {
-                "user_id": user_id,
-                "flight_id": state["confirmation_data"]["item_id"],
-                "total_price": state["confirmation_data"]["price"],
-                "booking_date": datetime.utcnow(),
-                "passenger_name": "TBD",
-                "passenger_email": "TBD@example.com"
-            }
-            result = await db.flight_bookings.insert_one(booking_data)
-            await db.flights.update_one(
-                {"_id": ObjectId(state["confirmation_data"]["item_id"])},
-                {"$inc": {"seats_available": -1}}
-            )
-            response = f"Flight booking confirmed with ID: {str(result.inserted_id)}"
-        else:
-            booking_data = {
-                "user_id": user_id,
-                "hotel_id": state["confirmation_data"]["item_id"],
-                "total_price": state["confirmation_data"]["price"],
-                "booking_date": datetime.utcnow(),
-                "guest_name": "TBD",
-                "guest_email": "TBD@example.com"
-            }
-            result = await db.hotel_bookings.insert_one(booking_data)
-            await db.hotels.update_one(
-                {"_id": ObjectId(state["confirmation_data"]["item_id"])},
-                {"$inc": {"available_rooms": -1}}
-            )
-            response = f"Hotel booking confirmed with ID: {str(result.inserted_id)}"
+
+    # A trip confirmation carries one payload per kind, all booked in the same transaction
+    if state["agent_type"] == "trip":
+        confirmations = {kind: state["confirmation_data"][kind] for kind in ("flight", "hotel") if kind in state["confirmation_data"]}
     else:
-        response = "Booking cancelled by user"
-    
-    state["messages"].append({"role": "system", "content": response})
-    state["requires_confirmation"] = False
-    state["confirmation_data"] = None
-    
-    await graph.ainvoke(state, config={"configurable": {"thread_id": request.session_id}})
-    
+        confirmations = {state["agent_type"]: state["confirmation_data"]}
+
+    async def book(session):
+        if not request.confirmed:
+            response = "Booking cancelled by user"
+        else:
+            lines = []
+            for kind, confirmation in confirmations.items():
+                inventory, stock_field, bookings, item_field, contact = BOOKING_TARGETS[kind]
+                item = await db[inventory].find_one(
+                    {"_id": ObjectId(confirmation["item_id"])},
+                    {"counter_shards": 1, "room_type": 1, "check_in_date": 1, "check_out_date": 1},
+                    session=session
+                )
+                stay = {}
+                if item and kind == "hotel" and confirmation.get("check_in_date"):
+                    # Dated stays take rooms from the calendar, like demo_api's dated bookings
+                    stay = {
+                        "check_in_date": datetime.fromisoformat(confirmation["check_in_date"]),
+                        "check_out_date": datetime.fromisoformat(confirmation["check_out_date"]),
+                        "rooms": 1
+                    }
+                    try:
+                        allocated = await availability.reserve(
+                            db, confirmation["item_id"], item["room_type"], stay["check_in_date"],
+                            confirmation["nights"], session=session
+                        )
+                    except ValueError as e:
+                        raise HTTPException(status_code=400, detail=str(e))
+                elif item and kind == "hotel" and not await availability.hold_window(db, item, session=session):
+                    # Undated stays hold the room across the listing window, like demo_api's undated bookings
+                    allocated = False
+                elif item and item.get("counter_shards"):
+                    # The reconciler rewrites the item's stock from the shards, so take it from them
+                    allocated = await shard_inventory.allocate(
+                        db, inventory, confirmation["item_id"], item["counter_shards"], session=session
+                    )
+                else:
+                    updated = await db[inventory].update_one(
+                        {"_id": ObjectId(confirmation["item_id"]), stock_field: {"$gt": 0}, **shard_inventory.UNSHARDED},
+                        {"$inc": {stock_field: -1}},
+                        session=session
+                    )
+                    allocated = updated.modified_count == 1
+                if not allocated:
+                    raise HTTPException(status_code=409, detail=f"{kind.capitalize()} no longer available")
+                result = await db[bookings].insert_one({
+                    "user_id": user_id,
+                    item_field: confirmation["item_id"],
+                    "total_price": confirmation["price"],
+                    "booking_date": datetime.utcnow(),
+                    **stay,
+                    **contact
+                }, session=session)
+                lines.append(f"{kind.capitalize()} booking confirmed with ID: {str(result.inserted_id)}")
+            response = "\n".join(lines)
+
+        await db.booking_confirmations.insert_one({
+            "_id": idempotency_key,
+            "user_id": user_id,
+            "response": {"response": response, "session_id": request.session_id},
+            "created_at": datetime.utcnow()
+        }, session=session)
+        return response
+
+    try:
+        async with await client.start_session() as session:
+            response = await session.with_transaction(book)
+    except DuplicateKeyError:
+        # A concurrent retry committed first; its booking stands and ours was rolled back
+        cached = await db.booking_confirmations.find_one({"_id": idempotency_key, "user_id": user_id})
+        if cached is None:
+            raise HTTPException(status_code=409, detail="Confirmation already used")
+        return ChatResponse(**cached["response"])
+
+    # Stock just changed; don't let the next turn quote cached availability
+    if travel_api:
+        for kind, confirmation in confirmations.items():
+            travel_api.invalidate(BOOKING_TARGETS[kind][0], [confirmation["item_id"]])
+
+    await graph.aupdate_state({"configurable": {"thread_id": request.session_id}}, {
+        "messages": state["messages"] + [{"role": "system", "content": response}],
+        "requires_confirmation": False,
+        "confirmation_data": None,
+        "last_confirmation_nonce": nonce
+    })
+
     return ChatResponse(
         response=response,
         session_id=request.session_id
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,85 @@
+from schema.schemas import ChatRequest
+from service.agent_service import process_chat
+from utils.admission import admission
+from fastapi import HTTPException
+import asyncio
+import os
+import time
+
+MAX_BATCH_CONCURRENCY = int(os.getenv("MAX_BATCH_CONCURRENCY", "16"))
+MAX_BATCH_ITEMS = int(os.getenv("MAX_BATCH_ITEMS", "100"))
+# How long a batch keeps waiting out 429/503 Retry-After before failing its remaining items
+BATCH_ADMISSION_WAIT_SECONDS = float(os.getenv("BATCH_ADMISSION_WAIT_SECONDS", "120"))
+
+async def run_batch(items, user_id: str, concurrency: int = 4, skip_memory: bool = False, admit: bool = True):
+    """Run chat items through the graph, yielding one result per item as soon as it finishes.
+
+    Items sharing a session id are turns of one conversation: they run one after
+    another, in input order, so each sees the previous turn's state. Items without a
+    session id and with the same message run once and share the result. Each run
+    is admitted like a single chat request: it takes a token from the user's bucket and
+    holds an in-flight slot, so a batch can't get around the per-user rate limit;
+    a shed run waits out Retry-After and tries again until the batch's admission
+    deadline, after which it fails with the 429/503 details. Offline runs that own the process pass admit=False.
+    """
+    # Each chain is a list of groups run in order; chains run concurrently
+    chains, sessions, messages = [], {}, {}
+    for position, item in enumerate(items):
+        if item.session_id is None and item.message in messages:
+            messages[item.message].append((position, item))
+            continue
+        group = [(position, item)]
+        if item.session_id is None:
+            messages[item.message] = group
+            chains.append([group])
+        elif item.session_id in sessions:
+            sessions[item.session_id].append(group)
+        else:
+            sessions[item.session_id] = [group]
+            chains.append(sessions[item.session_id])
+
+    semaphore = asyncio.Semaphore(max(1, min(concurrency, MAX_BATCH_CONCURRENCY)))
+    finished = asyncio.Queue()
+    deadline = time.monotonic() + BATCH_ADMISSION_WAIT_SECONDS
+
+    async def run(group):
+        message, session_id = group[0][1].message, group[0][1].session_id
+        async with semaphore:
+            while admit:
+                try:
+                    await admission.acquire(user_id)
+                    break
+                except HTTPException as e:
+                    retry_after = int(e.headers["Retry-After"])
+                    if time.monotonic() + retry_after > deadline:
+                        return None, {"error": e.detail, "status_code": e.status_code, "retry_after": retry_after}
+                    await asyncio.sleep(retry_after)
+            try:
+                response = await process_chat(
+                    ChatRequest(message=message, session_id=session_id), user_id, skip_memory=skip_memory
+                )
+                return response.dict(), None
+            except Exception as e:
+                return None, {"error": str(e)}
+            finally:
+                if admit:
+                    admission.release()
+
+    async def run_chain(chain):
+        for group in chain:
+            await finished.put((group, *await run(group)))
+
+    tasks = [asyncio.create_task(run_chain(chain)) for chain in chains]
+    try:
+        for _ in range(sum(len(chain) for chain in chains)):
+            group, response, error = await finished.get()
+            for position, item in group:
+                result = {"id": item.id if item.id is not None else str(position), "deduplicated": len(group) > 1}
+                if error is None:
+                    result.update(response)
+                else:
+                    result.update(error)
+                yield result
+    finally:
+        for task in tasks:
+            task.cancel()
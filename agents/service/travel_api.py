@@ -0,0 +1,91 @@
+import httpx
+import asyncio
+import os
+import time
+
+# Client for demo_api's batch lookups. A single pooled AsyncClient keeps
+# connections alive across calls; ids already being fetched by another
+# coroutine join that request instead of issuing their own, and results
+# (including misses) are cached for a few seconds so bursts of agent turns
+# touching the same items cost one round trip.
+
+DEMO_API_URL = os.getenv("DEMO_API_URL")  # unset: the agents read Mongo directly
+DEMO_API_CACHE_TTL_SECONDS = float(os.getenv("DEMO_API_CACHE_TTL_SECONDS", "5"))
+DEMO_API_MAX_CONNECTIONS = int(os.getenv("DEMO_API_MAX_CONNECTIONS", "20"))
+DEMO_API_TIMEOUT_SECONDS = float(os.getenv("DEMO_API_TIMEOUT_SECONDS", "5"))
+CACHE_MAX_ENTRIES = 10000
+
+class TravelApiClient:
+    def __init__(self, base_url: str, ttl: float = DEMO_API_CACHE_TTL_SECONDS,
+                 max_connections: int = DEMO_API_MAX_CONNECTIONS, timeout: float = DEMO_API_TIMEOUT_SECONDS):
+        self.ttl = ttl
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout
+        )
+        self.cache = {}     # (kind, id) -> (expires_at, document or None)
+        self.inflight = {}  # (kind, id) -> task resolving the batch that contains it
+        self.stats = {"requests": 0, "cache_hits": 0, "coalesced": 0}
+
+    async def get_many(self, kind: str, ids) -> dict:
+        """Map id -> document for the ids of `kind` ("flights" or "hotels") that exist."""
+        now = time.monotonic()
+        result, missing, waiting = {}, [], {}
+        for item_id in dict.fromkeys(ids):
+            cached = self.cache.get((kind, item_id))
+            if cached and cached[0] > now:
+                self.stats["cache_hits"] += 1
+                if cached[1] is not None:
+                    result[item_id] = cached[1]
+            elif (kind, item_id) in self.inflight:
+                self.stats["coalesced"] += 1
+                waiting[item_id] = self.inflight[(kind, item_id)]
+            else:
+                missing.append(item_id)
+
+        if missing:
+            task = asyncio.ensure_future(self._fetch(kind, missing))
+            for item_id in missing:
+                self.inflight[(kind, item_id)] = task
+                waiting[item_id] = task
+            task.add_done_callback(lambda done: self._forget(kind, missing, done))
+
+        # Shield so a cancelled caller doesn't cancel a batch other callers are waiting on
+        for task in set(waiting.values()):
+            found = await asyncio.shield(task)
+            for item_id, owner in waiting.items():
+                if owner is task and item_id in found:
+                    result[item_id] = found[item_id]
+        return result
+
+    async def get(self, kind: str, item_id: str):
+        return (await self.get_many(kind, [item_id])).get(item_id)
+
+    async def _fetch(self, kind: str, ids: list) -> dict:
+        self.stats["requests"] += 1
+        response = await self.client.post(f"/{kind}/batch", json={"ids": ids})
+        response.raise_for_status()
+        found = {document["id"]: document for document in response.json()}
+
+        expires_at = time.monotonic() + self.ttl
+        if len(self.cache) > CACHE_MAX_ENTRIES:
+            now = time.monotonic()
+            self.cache = {key: entry for key, entry in self.cache.items() if entry[0] > now}
+        for item_id in ids:
+            self.cache[(kind, item_id)] = (expires_at, found.get(item_id))
+        return found
+
+    def _forget(self, kind: str, ids: list, task):
+        for item_id in ids:
+            if self.inflight.get((kind, item_id)) is task:
+                del self.inflight[(kind, item_id)]
+
+    def invalidate(self, kind: str, ids):
+        for item_id in ids:
+            self.cache.pop((kind, item_id), None)
+
+    async def close(self):
+        await self.client.aclose()
+
+travel_api = TravelApiClient(DEMO_API_URL) if DEMO_API_URL else None
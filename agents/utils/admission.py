@@ -0,0 +1,135 @@
+from fastapi import Depends, HTTPException
+from pymongo import ReturnDocument
+from utils.auth import get_current_user
+from service.db_service import get_database
+import asyncio
+import math
+import os
+import time
+
+# Admission control for the LLM-backed endpoints. Each user gets a token
+# bucket keyed by their JWT `sub`; on top of that a per-process cap limits
+# how many requests run at once, with a bounded queue in front of it.
+# Rate-limited requests get 429, overloaded ones 503, both with Retry-After.
+
+RATE_PER_SECOND = float(os.getenv("ADMISSION_RATE_PER_SECOND", "0.5"))
+BURST = float(os.getenv("ADMISSION_BURST", "5"))
+MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "16"))
+MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "10"))
+# "memory" keeps buckets in this process; "mongo" shares them across workers
+BACKEND = os.getenv("ADMISSION_BACKEND", "memory")
+
+
+class InMemoryTokenBuckets:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+
+    async def take(self, key: str) -> float:
+        """Take one token for `key`; return 0 if admitted, else seconds until one is available."""
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            self.buckets[key] = (tokens - 1, now)
+            return 0.0
+        self.buckets[key] = (tokens, now)
+        return (1 - tokens) / self.rate
+
+
+class MongoTokenBuckets:
+    """Token buckets stored in the `rate_limits` collection, refilled server-side in one atomic update."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+
+    async def take(self, key: str) -> float:
+        db = await get_database()
+        elapsed = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]}, 1000]}
+        bucket = await db.rate_limits.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {
+                    "tokens": {"$min": [self.burst, {"$add": [
+                        {"$ifNull": ["$tokens", self.burst]}, {"$multiply": [elapsed, self.rate]}
+                    ]}]},
+                    "updated_at": "$$NOW"
+                }},
+                {"$set": {"admitted": {"$gte": ["$tokens", 1]}}},
+                {"$set": {"tokens": {"$cond": ["$admitted", {"$subtract": ["$tokens", 1]}, "$tokens"]}}}
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if bucket["admitted"]:
+            return 0.0
+        return (1 - bucket["tokens"]) / self.rate
+
+
+class AdmissionController:
+    def __init__(self, buckets, max_in_flight: int, max_queue: int, queue_timeout: float):
+        self.buckets = buckets
+        self.max_in_flight = max_in_flight
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+        self.in_flight = 0
+        self.metrics = {"admitted": 0, "shed_rate_limited": 0, "shed_queue_full": 0, "shed_queue_timeout": 0}
+
+    async def acquire(self, user_id: str):
+        # Checked and counted before the first await, so requests arriving in the same
+        # loop tick can't all pass; shedding here also leaves the user's bucket untouched
+        if self.in_flight + self.waiting >= self.max_in_flight + self.max_queue:
+            self.metrics["shed_queue_full"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Server overloaded",
+                headers={"Retry-After": str(math.ceil(self.queue_timeout))},
+            )
+
+        self.waiting += 1
+        try:
+            retry_after = await self.buckets.take(user_id)
+            if retry_after > 0:
+                self.metrics["shed_rate_limited"] += 1
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many requests",
+                    headers={"Retry-After": str(math.ceil(retry_after))},
+                )
+            await asyncio.wait_for(self.slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.metrics["shed_queue_timeout"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Server overloaded",
+                headers={"Retry-After": str(math.ceil(self.queue_timeout))},
+            )
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        self.metrics["admitted"] += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self.slots.release()
+
+    def snapshot(self) -> dict:
+        return {**self.metrics, "in_flight": self.in_flight, "waiting": self.waiting}
+
+
+buckets = MongoTokenBuckets(RATE_PER_SECOND, BURST) if BACKEND == "mongo" else InMemoryTokenBuckets(RATE_PER_SECOND, BURST)
+admission = AdmissionController(buckets, MAX_IN_FLIGHT, MAX_QUEUE, QUEUE_TIMEOUT_SECONDS)
+
+async def admit_user(user_id: str = Depends(get_current_user)):
+    """Authenticate, then hold an admission slot for the duration of the request."""
+    await admission.acquire(user_id)
+    try:
+        yield user_id
+    finally:
+        admission.release()
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+from types import SimpleNamespace
+
+# Record/replay of the agents' non-deterministic dependencies. In record mode
+# LLM completions and Chroma history searches pass through to the real
+# services and are saved; in replay mode they are served from the cassette
+# and Chroma writes are dropped, so a trace replays identically every run.
+# Recording drops Chroma writes too: the trace must not add to live history,
+# and later searches in it then see what a replay will see.
+
+
+class CassetteMiss(KeyError):
+    pass
+
+
+def _key(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str = "replay"):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.entries = {"llm": {}, "search": {}}
+        if mode == "replay" or os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+        self.calls = []
+        self.searches = {}
+
+    def save(self):
+        if self.mode == "record":
+            with open(self.path, "w") as f:
+                json.dump(self.entries, f, indent=1, sort_keys=True)
+
+    def take_calls(self) -> list:
+        """LLM calls made since the last take, as {agent, prompt_chars, prompt_tokens}."""
+        calls, self.calls = self.calls, []
+        return calls
+
+    async def complete(self, agent_type: str, llm, prompt: str) -> str:
+        self.calls.append({
+            "agent": agent_type,
+            "prompt_chars": len(prompt),
+            # Whitespace tokens; stable across runs, which is what regression checks need
+            "prompt_tokens": len(prompt.split())
+        })
+        key = _key(agent_type, prompt)
+        if self.mode == "replay":
+            if key not in self.entries["llm"]:
+                raise CassetteMiss(f"No recorded completion for {agent_type} prompt {key[:12]}")
+            return self.entries["llm"][key]["completion"]
+        response = await llm.ainvoke(prompt)
+        self.entries["llm"][key] = {"agent": agent_type, "prompt": prompt, "completion": response.content}
+        return response.content
+
+    def search(self, vectorstore, query: str, k: int) -> list:
+        # The same query can return different history later in a trace, so key on its occurrence too
+        occurrence = self.searches.get((query, k), 0)
+        self.searches[(query, k)] = occurrence + 1
+        key = _key(query, k, occurrence)
+        if self.mode == "replay":
+            if key not in self.entries["search"]:
+                raise CassetteMiss(f"No recorded history search for {query!r}")
+            return [SimpleNamespace(page_content=text) for text in self.entries["search"][key]]
+        documents = vectorstore.similarity_search(query, k=k)
+        self.entries["search"][key] = [document.page_content for document in documents]
+        return documents
+
+
+class CassetteLLM:
+    def __init__(self, agent_type: str, llm, cassette: Cassette):
+        self.agent_type = agent_type
+        self.llm = llm
+        self.cassette = cassette
+
+    async def ainvoke(self, prompt):
+        content = await self.cassette.complete(self.agent_type, self.llm, str(prompt))
+        return SimpleNamespace(content=content)
+
+
+class CassetteVectorStore:
+    def __init__(self, vectorstore, cassette: Cassette):
+        self.vectorstore = vectorstore
+        self.cassette = cassette
+
+    def similarity_search(self, query: str, k: int = 4):
+        return self.cassette.search(self.vectorstore, query, k)
+
+    def add_texts(self, texts, metadatas=None):
+        return []
@@ -0,0 +1,269 @@
+from collections import deque
+from datetime import datetime, timedelta
+import logging
+import re
+
+# Deterministic travel-entity extraction, run on every chat message before
+# the graph. Airport codes and city names are found in one pass with an
+# Aho-Corasick automaton over the gazetteer; dates, nights, passenger counts
+# and budgets come from a few anchored regexes, with relative dates resolved
+# against the request time.
+
+logger = logging.getLogger(__name__)
+
+# Seed gazetteer: domestic airports and the city names people use for them.
+# load_gazetteer() adds whatever else appears in the flights/hotels collections.
+AIRPORTS = {
+    "DAC": "Dhaka",
+    "CGP": "Chattogram",
+    "CXB": "Cox's Bazar",
+    "ZYL": "Sylhet",
+    "SPD": "Saidpur",
+    "RJH": "Rajshahi",
+    "JSR": "Jashore",
+    "BZL": "Barishal",
+}
+CITY_ALIASES = {
+    "dhaka": "Dhaka",
+    "chattogram": "Chattogram",
+    "chittagong": "Chattogram",
+    "ctg": "Chattogram",
+    "cox's bazar": "Cox's Bazar",
+    "coxs bazar": "Cox's Bazar",
+    "cox bazar": "Cox's Bazar",
+    "sylhet": "Sylhet",
+    "saidpur": "Saidpur",
+    "rajshahi": "Rajshahi",
+    "jashore": "Jashore",
+    "jessore": "Jashore",
+    "barishal": "Barishal",
+    "barisal": "Barishal",
+    "khulna": "Khulna",
+}
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "a": 1, "an": 1, "single": 1, "couple": 2,
+}
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+_NUMBER = r"(\d+|one|two|three|four|five|six|seven|eight|nine|ten|a|an|single|couple of)"
+_MONTH = (
+    r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+    r"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\b\.?"
+)
+_NIGHTS = re.compile(rf"\b{_NUMBER}\s+nights?\b")
+_PASSENGERS = re.compile(rf"\b{_NUMBER}\s+(?:passengers?|people|persons?|adults?|guests?|travell?ers?|tickets?|seats?)\b")
+_BUDGET = re.compile(
+    r"\b(?:under|below|less than|max(?:imum)?|budget(?: of| is)?|within|up to|upto|cheaper than)\s*"
+    r"(?:bdt|tk\.?|taka|৳)?\s*(\d[\d,]*(?:\.\d+)?)\s*(k)?\b"
+    # Not a price when a unit follows: "max 5 stars", "under 3 nights", "up to 4 people"
+    r"(?![\s-]*(?:stars?|nights?|days?|weeks?|hours?|hrs?|stops?|rooms?|beds?|people|persons?|guests?|adults?"
+    r"|passengers?|travell?ers?|seats?|tickets?|km|%))"
+)
+_ISO_DATE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+_DAY_MONTH = re.compile(rf"\b(\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?{_MONTH}(?:\s+(\d{{4}}))?")
+_MONTH_DAY = re.compile(rf"\b{_MONTH}\s+(\d{{1,2}})(?:st|nd|rd|th)?\b(?:,?\s+(\d{{4}}))?")
+_IN_DAYS = re.compile(rf"\bin\s+{_NUMBER}\s+(days?|weeks?)\b")
+_WEEKDAY = re.compile(r"\b(?:(this|next|on)\s+)?(monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b")
+_RELATIVE = re.compile(r"\b(day after tomorrow|tomorrow|today|tonight|this weekend|next week)\b")
+_ROUTE_SEPARATOR = re.compile(r"\s*(?:to|-|–|→)\s*")
+_INTENT_BOOK = re.compile(r"\b(book|booking|reserve|reservation|confirm)\b")
+
+
+def _number(text: str) -> int:
+    text = text.replace("couple of", "couple")
+    return int(text) if text.isdigit() else NUMBER_WORDS[text]
+
+
+class _Automaton:
+    """Aho-Corasick automaton over lowercase patterns, reporting whole-word matches."""
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+    def add(self, pattern: str, value):
+        node = 0
+        for char in pattern:
+            if char not in self.goto[node]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[node][char] = len(self.goto) - 1
+            node = self.goto[node][char]
+        self.output[node].append((len(pattern), value))
+
+    def build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find(self, text: str):
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for length, value in self.output[node]:
+                start = i - length + 1
+                before = text[start - 1] if start > 0 else " "
+                after = text[i + 1] if i + 1 < len(text) else " "
+                if not before.isalnum() and not after.isalnum():
+                    yield start, i + 1, value
+
+
+class EntityExtractor:
+    def __init__(self, airports=None, city_aliases=None):
+        self.airports = dict(AIRPORTS if airports is None else airports)
+        self.city_aliases = dict(CITY_ALIASES if city_aliases is None else city_aliases)
+        self._build()
+
+    def _build(self):
+        self.city_airports = {}
+        for code, city in self.airports.items():
+            self.city_airports.setdefault(city, code)
+        automaton = _Automaton()
+        for code in self.airports:
+            automaton.add(code.lower(), ("airport", code))
+        for alias, city in self.city_aliases.items():
+            automaton.add(alias, ("city", city))
+        automaton.build()
+        self.automaton = automaton
+
+    async def load_gazetteer(self, db):
+        """Add airports and cities found in the flights and hotels collections."""
+        for field in ("departure_airport", "arrival_airport"):
+            for code in await db.flights.distinct(field):
+                self.airports.setdefault(code, code)
+        for city in await db.hotels.distinct("address.city"):
+            self.city_aliases.setdefault(city.lower(), city)
+        self._build()
+        logger.info("Entity gazetteer: %d airports, %d city names", len(self.airports), len(self.city_aliases))
+
+    def _places(self, text: str, lowered: str) -> dict:
+        airports, cities, origin, destination = [], [], None, None
+        spans = []
+        last_end = -1
+        for start, end, (kind, value) in self.automaton.find(lowered):
+            if start < last_end:
+                continue
+            last_end = end
+            if kind == "airport":
+                # Bare codes only count when written in capitals, so "dac" in prose is not a match
+                if text[start:end] != value:
+                    continue
+                code, city = value, self.airports.get(value, value)
+            else:
+                code, city = self.city_airports.get(value), value
+            if code and code not in airports:
+                airports.append(code)
+            if city not in cities:
+                cities.append(city)
+            spans.append((start, end, code or city))
+            preceding = lowered[max(0, start - 6):start]
+            if re.search(r"\bfrom\s+$", preceding):
+                origin = code or city
+            elif re.search(r"\b(to|into|in|at)\s+$", preceding) and destination is None:
+                destination = code or city
+        # "DAC to ZYL", "Dhaka - Rajshahi": a bare pair reads as origin then destination
+        if origin is None:
+            for (_, first_end, first), (second_start, _, second) in zip(spans, spans[1:]):
+                if _ROUTE_SEPARATOR.fullmatch(lowered[first_end:second_start]):
+                    origin, destination = first, second
+                    break
+        return {"airports": airports, "cities": cities, "origin": origin, "destination": destination}
+
+    def _dates(self, lowered: str, anchor: datetime) -> list:
+        today = anchor.date()
+        dates = []
+
+        for match in _ISO_DATE.finditer(lowered):
+            try:
+                dates.append((match.start(), datetime(*map(int, match.groups())).date()))
+            except ValueError:
+                continue
+        for match in _DAY_MONTH.finditer(lowered):
+            dates.append((match.start(), self._calendar_date(today, int(match.group(1)), match.group(2), match.group(3))))
+        for match in _MONTH_DAY.finditer(lowered):
+            dates.append((match.start(), self._calendar_date(today, int(match.group(2)), match.group(1), match.group(3))))
+        for match in _IN_DAYS.finditer(lowered):
+            days = _number(match.group(1)) * (7 if match.group(2).startswith("week") else 1)
+            dates.append((match.start(), today + timedelta(days=days)))
+        for match in _RELATIVE.finditer(lowered):
+            phrase = match.group(1)
+            if phrase == "day after tomorrow":
+                offset = 2
+            elif phrase == "tomorrow":
+                offset = 1
+            elif phrase in ("today", "tonight"):
+                offset = 0
+            elif phrase == "this weekend":
+                # Friday and Saturday are the weekend here
+                offset = 0 if today.weekday() == 5 else (4 - today.weekday()) % 7
+            else:  # next week
+                offset = 7 - today.weekday()
+            dates.append((match.start(), today + timedelta(days=offset)))
+        for match in _WEEKDAY.finditer(lowered):
+            offset = (WEEKDAYS.index(match.group(2)) - today.weekday()) % 7
+            if offset == 0 and match.group(1) != "this":
+                offset = 7
+            dates.append((match.start(), today + timedelta(days=offset)))
+
+        seen, ordered = set(), []
+        for _, date in sorted(dates, key=lambda item: item[0]):
+            if date and date not in seen:
+                seen.add(date)
+                ordered.append(date.isoformat())
+        return ordered
+
+    @staticmethod
+    def _calendar_date(today, day: int, month: str, year):
+        month_number = MONTHS[month[:3]]
+        try:
+            date = datetime(int(year) if year else today.year, month_number, day).date()
+        except ValueError:
+            return None
+        # Without a year, "Aug 10" means the next Aug 10
+        if not year and date < today:
+            try:
+                date = date.replace(year=today.year + 1)
+            except ValueError:
+                return None
+        return date
+
+    def extract(self, message: str, anchor: datetime = None) -> dict:
+        anchor = anchor or datetime.utcnow()
+        lowered = message.lower()
+        entities = self._places(message, lowered)
+        entities["dates"] = self._dates(lowered, anchor)
+
+        match = _NIGHTS.search(lowered)
+        entities["nights"] = _number(match.group(1)) if match else None
+        match = _PASSENGERS.search(lowered)
+        entities["passengers"] = _number(match.group(1)) if match else None
+        match = _BUDGET.search(lowered)
+        if match:
+            amount = float(match.group(1).replace(",", ""))
+            entities["budget"] = amount * 1000 if match.group(2) else amount
+        else:
+            entities["budget"] = None
+        entities["intent"] = "book" if _INTENT_BOOK.search(lowered) else "search"
+        # The day relative dates were resolved against, for filters that mean "from now on"
+        entities["today"] = anchor.strftime("%Y-%m-%d")
+        return entities
+
+
+extractor = EntityExtractor()
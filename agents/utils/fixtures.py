@@ -0,0 +1,26 @@
+from bson import json_util
+
+# Mongo fixture snapshots for deterministic replays: the collections the
+# agents read are dumped to one extended-JSON file and restored verbatim,
+# _ids included, into the database a replay runs against.
+
+COLLECTIONS = [
+    "flights", "hotels", "flight_bookings", "hotel_bookings",
+    "route_summaries", "city_summaries", "hotel_calendars",
+]
+
+async def snapshot(db, path: str, collections=COLLECTIONS):
+    data = {}
+    for name in collections:
+        data[name] = await db[name].find().sort("_id", 1).to_list(None)
+    with open(path, "w") as f:
+        f.write(json_util.dumps(data, indent=1))
+
+async def restore(db, path: str):
+    with open(path) as f:
+        data = json_util.loads(f.read())
+    for name, documents in data.items():
+        await db[name].delete_many({})
+        if documents:
+            await db[name].insert_many(documents)
+    await db.booking_confirmations.delete_many({})
@@ -0,0 +1,143 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse
+from utils.auth import JWT_SECRET
+import json
+import os
+import time
+import uuid
+import jwt
+
+# On-demand request profiling. With PROFILING_ENABLED=1, a request carrying
+# `X-Profile: 1` and an admin bearer token is run under pyinstrument; the
+# speedscope output and per-stage timings are kept on disk, retaining only
+# the slowest PROFILE_KEEP profiles. Other requests pay a header lookup.
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_SECONDS", "0.001"))
+ADMIN_USER_IDS = {user_id for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id}
+
+_stages: ContextVar = ContextVar("profile_stages", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Record the wall time of a pipeline stage when the current request is being profiled."""
+    stages = _stages.get()
+    if stages is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages.append({
+            "stage": name,
+            "start_ms": round((start - stages.origin) * 1000, 3),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3)
+        })
+
+
+class _Stages(list):
+    def __init__(self):
+        super().__init__()
+        self.origin = time.perf_counter()
+
+
+@contextmanager
+def collect_stages():
+    """Record stage() timings for everything run inside the block, including tasks it spawns."""
+    stages = _Stages()
+    token = _stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _stages.reset(token)
+
+
+def is_admin(user_id: str) -> bool:
+    return user_id in ADMIN_USER_IDS
+
+
+def _admin_from_request(request: Request) -> bool:
+    authorization = request.headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return False
+    try:
+        payload = jwt.decode(authorization[7:], JWT_SECRET, algorithms=["HS256"])
+    except jwt.InvalidTokenError:
+        return False
+    return is_admin(payload.get("sub"))
+
+
+def _meta_path(request_id: str) -> str:
+    return os.path.join(PROFILE_DIR, f"{request_id}.meta.json")
+
+
+def _profile_path(request_id: str) -> str:
+    return os.path.join(PROFILE_DIR, f"{request_id}.speedscope.json")
+
+
+def list_profiles() -> list:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        if name.endswith(".meta.json"):
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                profiles.append(json.load(f))
+    return sorted(profiles, key=lambda meta: meta["duration_ms"], reverse=True)
+
+
+def _store(meta: dict, speedscope: str):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(_profile_path(meta["request_id"]), "w") as f:
+        f.write(speedscope)
+    with open(_meta_path(meta["request_id"]), "w") as f:
+        json.dump(meta, f)
+
+    # Keep only the slowest PROFILE_KEEP profiles
+    for evicted in list_profiles()[PROFILE_KEEP:]:
+        for path in (_meta_path(evicted["request_id"]), _profile_path(evicted["request_id"])):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+async def profiling_middleware(request: Request, call_next):
+    if request.headers.get("x-profile") != "1" or not _admin_from_request(request):
+        return await call_next(request)
+
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+
+    request_id = uuid.uuid4().hex
+    profiler = Profiler(interval=PROFILE_INTERVAL_SECONDS, async_mode="enabled")
+    start = time.perf_counter()
+    with collect_stages() as stages:
+        profiler.start()
+        try:
+            response = await call_next(request)
+        finally:
+            profiler.stop()
+
+    _store({
+        "request_id": request_id,
+        "method": request.method,
+        "path": request.url.path,
+        "status_code": response.status_code,
+        "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+        "started_at": time.time(),
+        "stages": list(stages)
+    }, profiler.output(renderer=SpeedscopeRenderer()))
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+def profile_file(request_id: str) -> FileResponse:
+    path = _profile_path(request_id)
+    if not request_id.isalnum() or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", filename=os.path.basename(path))
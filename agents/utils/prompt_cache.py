@@ -0,0 +1,71 @@
+from collections import OrderedDict
+import hashlib
+import json
+
+# Prompt assembly in cacheable layers plus local accounting of how much of
+# each prompt a prefix cache (Groq-side or a local KV cache) could reuse.
+# Layers go from most to least stable: static instructions, the inventory
+# summary block, then the per-turn tail. Keeping earlier layers
+# byte-identical across calls is what makes the prefix reusable.
+
+
+def stable_json(value) -> str:
+    """Serialize with sorted keys and fixed separators so equal data gives equal text."""
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def count_tokens(text: str) -> int:
+    # Rough and provider-agnostic; good enough to compare cached vs uncached shares
+    return max(1, len(text) // 4) if text else 0
+
+
+class PrefixCacheReport:
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self.seen = OrderedDict()
+        self.stats = {}
+
+    def record(self, agent_type: str, layers: list) -> int:
+        """Account one prompt; return how many leading tokens a prefix cache would have reused."""
+        digest = hashlib.sha256()
+        cumulative, cached = 0, 0
+        prefixes = []
+        for layer in layers[:-1]:
+            digest.update(layer.encode())
+            cumulative += count_tokens(layer)
+            prefixes.append((digest.hexdigest(), cumulative))
+        for prefix, tokens in prefixes:
+            if prefix in self.seen:
+                self.seen.move_to_end(prefix)
+                cached = tokens
+            else:
+                break
+        for prefix, _ in prefixes:
+            self.seen[prefix] = True
+            self.seen.move_to_end(prefix)
+        while len(self.seen) > self.capacity:
+            self.seen.popitem(last=False)
+
+        total = sum(count_tokens(layer) for layer in layers)
+        stats = self.stats.setdefault(agent_type, {
+            "calls": 0, "prompt_tokens": 0, "cached_prefix_tokens": 0,
+            "static_tokens": 0, "inventory_tokens": 0, "tail_tokens": 0
+        })
+        stats["calls"] += 1
+        stats["prompt_tokens"] += total
+        stats["cached_prefix_tokens"] += cached
+        for name, layer in zip(("static_tokens", "inventory_tokens", "tail_tokens"), layers):
+            stats[name] += count_tokens(layer)
+        return cached
+
+    def snapshot(self) -> dict:
+        return {
+            agent_type: {
+                **stats,
+                "cached_share": round(stats["cached_prefix_tokens"] / stats["prompt_tokens"], 3) if stats["prompt_tokens"] else 0.0
+            }
+            for agent_type, stats in self.stats.items()
+        }
+
+
+report = PrefixCacheReport()
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+# Materialized summaries over flights and hotels, shared with the agents
+# service through the route_summaries and city_summaries collections:
+#   route_summaries: cheapest bookable flight per route per departure day
+#   city_summaries:  hotels per city per price band
+# Both are built in full at startup and kept current from change streams on
+# the inventory collections, so booking writes from either service refresh them.
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (BDT per night); anything above the last bound is "luxury"
+PRICE_BANDS = [("budget", 5000), ("mid", 10000), ("upscale", 15000)]
+
+def _route_pipeline(match: dict) -> list:
+    return [
+        {"$match": {
+            **match,
+            "seats_available": {"$gt": 0},
+            "status": {"$ne": "cancelled"},
+            # Departed flights are not bookable; readers also skip rows for past days
+            "$expr": {"$gte": ["$departure_time", "$$NOW"]}
+        }},
+        {"$sort": {"price": 1}},
+        {"$group": {
+            "_id": {
+                "departure_airport": "$departure_airport",
+                "arrival_airport": "$arrival_airport",
+                "date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$departure_time"}}
+            },
+            "flight_id": {"$first": {"$toString": "$_id"}},
+            "flight_number": {"$first": "$flight_number"},
+            "airline": {"$first": "$airline"},
+            "price": {"$first": "$price"},
+            "departure_time": {"$first": "$departure_time"},
+            "flights": {"$sum": 1},
+            "seats_available": {"$sum": "$seats_available"}
+        }},
+        {"$set": {
+            "departure_airport": "$_id.departure_airport",
+            "arrival_airport": "$_id.arrival_airport",
+            "date": "$_id.date",
+            "updated_at": "$$NOW"
+        }}
+    ]
+
+def _price_band_expression() -> dict:
+    return {"$switch": {
+        "branches": [
+            {"case": {"$lt": ["$price_per_night", bound]}, "then": band}
+            for band, bound in PRICE_BANDS
+        ],
+        "default": "luxury"
+    }}
+
+def _city_pipeline(match: dict) -> list:
+    return [
+        {"$match": {**match, "available_rooms": {"$gt": 0}}},
+        {"$sort": {"price_per_night": 1}},
+        {"$group": {
+            "_id": {"city": "$address.city", "band": _price_band_expression()},
+            "hotels": {"$sum": 1},
+            "available_rooms": {"$sum": "$available_rooms"},
+            "min_price": {"$first": "$price_per_night"},
+            "max_price": {"$max": "$price_per_night"},
+            "cheapest_hotel_id": {"$first": {"$toString": "$_id"}},
+            "cheapest_hotel": {"$first": "$name"}
+        }},
+        {"$set": {"city": "$_id.city", "band": "$_id.band", "updated_at": "$$NOW"}}
+    ]
+
+async def rebuild_all(db):
+    await db.route_summaries.delete_many({})
+    await db.city_summaries.delete_many({})
+    await db.flights.aggregate(_route_pipeline({}) + [{"$merge": {"into": "route_summaries"}}]).to_list(None)
+    await db.hotels.aggregate(_city_pipeline({}) + [{"$merge": {"into": "city_summaries"}}]).to_list(None)
+
+async def refresh_route(db, departure_airport: str, arrival_airport: str, departure_time: datetime):
+    day = departure_time.replace(hour=0, minute=0, second=0, microsecond=0)
+    key = {
+        "departure_airport": departure_airport,
+        "arrival_airport": arrival_airport,
+        "date": day.strftime("%Y-%m-%d")
+    }
+    rows = await db.flights.aggregate(_route_pipeline({
+        "departure_airport": departure_airport,
+        "arrival_airport": arrival_airport,
+        "departure_time": {"$gte": day, "$lt": day + timedelta(days=1)}
+    })).to_list(1)
+    if rows:
+        await db.route_summaries.replace_one({"_id": key}, rows[0], upsert=True)
+    else:
+        await db.route_summaries.delete_one({"_id": key})
+
+async def refresh_city(db, city: str):
+    rows = await db.hotels.aggregate(_city_pipeline({"address.city": city})).to_list(None)
+    await db.city_summaries.delete_many({"city": city, "band": {"$nin": [row["band"] for row in rows]}})
+    for row in rows:
+        await db.city_summaries.replace_one({"_id": row["_id"]}, row, upsert=True)
+
+async def _refresh_from_change(db, collection: str, change: dict):
+    document = change.get("fullDocument")
+    before = change.get("fullDocumentBeforeChange")
+    if document is None:
+        # Deletes carry no document unless pre-images are enabled; rebuild instead
+        if before is None:
+            await rebuild_all(db)
+            return
+        document = before
+
+    # Without a pre-image a move to another route/day or city can't be traced back; rebuild
+    moved_fields = {"flights": {"departure_airport", "arrival_airport", "departure_time"}, "hotels": {"address"}}[collection]
+    updated = set(change.get("updateDescription", {}).get("updatedFields", {}))
+    if before is None and (change["operationType"] == "replace"
+                           or any(field.split(".")[0] in moved_fields for field in updated)):
+        await rebuild_all(db)
+        return
+
+    if collection == "flights":
+        await refresh_route(db, document["departure_airport"], document["arrival_airport"], document["departure_time"])
+        # An update can move a flight to another route or day
+        if before and (before["departure_airport"], before["arrival_airport"], before["departure_time"].date()) != \
+                (document["departure_airport"], document["arrival_airport"], document["departure_time"].date()):
+            await refresh_route(db, before["departure_airport"], before["arrival_airport"], before["departure_time"])
+    else:
+        await refresh_city(db, document["address"]["city"])
+        if before and before["address"]["city"] != document["address"]["city"]:
+            await refresh_city(db, before["address"]["city"])
+
+async def _watch(db, collection: str):
+    async with db[collection].watch(full_document="updateLookup", full_document_before_change="whenAvailable") as stream:
+        async for change in stream:
+            try:
+                await _refresh_from_change(db, collection, change)
+            except Exception:
+                logger.exception("Failed to refresh %s summary", collection)
+
+async def enable_pre_images(db):
+    # Lets the watchers see where an updated or deleted document used to be (MongoDB 6.0+)
+    for collection in ("flights", "hotels"):
+        try:
+            await db.command({"collMod": collection, "changeStreamPreAndPostImages": {"enabled": True}})
+        except Exception as e:
+            logger.warning("Pre-images unavailable for %s, moves fall back to full rebuilds: %s", collection, e)
+
+async def maintain_summaries(db):
+    await enable_pre_images(db)
+    await rebuild_all(db)
+    await asyncio.gather(_watch(db, "flights"), _watch(db, "hotels"))
+
+async def get_route_summaries(db, departure_airport=None, arrival_airport=None, date=None, limit=100):
+    query = {"date": {"$gte": datetime.utcnow().strftime("%Y-%m-%d")}}
+    if departure_airport:
+        query["departure_airport"] = departure_airport
+    if arrival_airport:
+        query["arrival_airport"] = arrival_airport
+    if date:
+        query["date"] = date
+    return await db.route_summaries.find(query, {"_id": 0}).sort([("date", 1), ("price", 1)]).to_list(limit)
+
+async def get_city_summaries(db, city=None, band=None, limit=100):
+    query = {}
+    if city:
+        query["city"] = city
+    if band:
+        query["band"] = band
+    return await db.city_summaries.find(query, {"_id": 0}).sort([("city", 1), ("min_price", 1)]).to_list(limit)
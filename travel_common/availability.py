@@ -0,0 +1,181 @@
+from bson import ObjectId
+from datetime import datetime
+import asyncio
+import os
+
+# Per-night hotel inventory. Each hotel room type has one document in
+# hotel_calendars holding a fixed-origin array of room counts: nights[i] is
+# the number of rooms free on the night starting CALENDAR_ORIGIN + i days.
+# Every calendar shares the origin, so a date range maps to the same slice
+# of every document and range-minimum queries run server-side with $slice.
+# The origin never moves; instead calendars are extended daily so they always
+# reach CALENDAR_HORIZON_DAYS past today, and indexes stay valid in every process.
+#
+# The calendar gates every hotel booking. Dated bookings take their nights;
+# undated bookings hold a room on every remaining night of the hotel's listing
+# window and also take it from the hotel's available_rooms, which therefore
+# counts rooms not held by undated bookings. Calendars are filled from that
+# count, so rebuilding one only has to subtract dated bookings.
+
+CALENDAR_ORIGIN = datetime.fromisoformat(os.getenv("CALENDAR_ORIGIN", "2025-01-01"))
+CALENDAR_HORIZON_DAYS = int(os.getenv("CALENDAR_HORIZON_DAYS", "730"))
+EXTEND_INTERVAL_SECONDS = 3600
+
+def night_index(date: datetime) -> int:
+    return (datetime(date.year, date.month, date.day) - CALENDAR_ORIGIN).days
+
+def calendar_length(now: datetime = None) -> int:
+    """Nights every calendar covers once extended up to `now`."""
+    return night_index(now or datetime.utcnow()) + CALENDAR_HORIZON_DAYS
+
+def _range(check_in: datetime, nights: int):
+    start = night_index(check_in)
+    if start < 0 or nights < 1 or start + nights > calendar_length():
+        raise ValueError("Stay is outside the availability calendar")
+    return start, nights
+
+def _open_nights(hotel: dict, start: int, end: int) -> list:
+    # Rooms are open on every night of the hotel's listed availability window
+    window_start, window_end = night_index(hotel["check_in_date"]), night_index(hotel["check_out_date"])
+    return [hotel["available_rooms"] if window_start <= i < window_end else 0 for i in range(start, end)]
+
+def calendar_id(hotel_id: str, room_type: str) -> str:
+    return f"{hotel_id}:{room_type}"
+
+def build_calendar(hotel: dict) -> dict:
+    return {
+        "_id": calendar_id(str(hotel["_id"]), hotel["room_type"]),
+        "hotel_id": str(hotel["_id"]),
+        "room_type": hotel["room_type"],
+        "city": hotel["address"]["city"],
+        "nights": _open_nights(hotel, 0, calendar_length())
+    }
+
+async def ensure_calendars(db):
+    await db.hotel_calendars.create_index("hotel_id")
+    await db.hotel_calendars.create_index("city")
+    existing = set(await db.hotel_calendars.distinct("hotel_id"))
+    async for hotel in db.hotels.find():
+        if str(hotel["_id"]) not in existing:
+            await db.hotel_calendars.insert_one(build_calendar(hotel))
+    await extend_calendars(db)
+
+async def extend_calendars(db):
+    """Append nights to calendars that end before today + CALENDAR_HORIZON_DAYS."""
+    target = calendar_length()
+    short = await db.hotel_calendars.find(
+        {"$expr": {"$lt": [{"$size": "$nights"}, target]}},
+        {"hotel_id": 1, "length": {"$size": "$nights"}}
+    ).to_list(None)
+    if not short:
+        return
+    hotels = await db.hotels.find({"_id": {"$in": [ObjectId(calendar["hotel_id"]) for calendar in short]}}).to_list(None)
+    by_id = {str(hotel["_id"]): hotel for hotel in hotels}
+    for calendar in short:
+        hotel = by_id.get(calendar["hotel_id"])
+        tail = _open_nights(hotel, calendar["length"], target) if hotel else [0] * (target - calendar["length"])
+        # Guarded on the current length so two extenders can't both append
+        await db.hotel_calendars.update_one(
+            {"_id": calendar["_id"], "nights": {"$size": calendar["length"]}},
+            {"$push": {"nights": {"$each": tail}}}
+        )
+
+async def extend_forever(db):
+    while True:
+        await asyncio.sleep(EXTEND_INTERVAL_SECONDS)
+        await extend_calendars(db)
+
+async def nightly_availability(db, hotel_id: str, room_type: str, check_in: datetime, nights: int) -> list:
+    start, length = _range(check_in, nights)
+    calendar = await db.hotel_calendars.find_one(
+        {"_id": calendar_id(hotel_id, room_type)},
+        {"nights": {"$slice": [start, length]}}
+    )
+    return calendar["nights"] if calendar else []
+
+async def rooms_available(db, check_in: datetime, nights: int, rooms: int = 1, hotel_ids=None, city=None,
+                          limit: int = 100) -> dict:
+    """Map hotel id -> rooms free on every night of the stay, for hotels with at least `rooms`."""
+    start, length = _range(check_in, nights)
+    # A calendar not yet extended this far must not report its truncated slice
+    match = {"$expr": {"$gte": [{"$size": "$nights"}, start + length]}}
+    if hotel_ids is not None:
+        match["hotel_id"] = {"$in": list(hotel_ids)}
+    if city:
+        match["city"] = city
+    rows = await db.hotel_calendars.aggregate([
+        {"$match": match},
+        {"$project": {"hotel_id": 1, "available": {"$min": {"$slice": ["$nights", start, length]}}}},
+        {"$match": {"available": {"$gte": rooms}}},
+        {"$sort": {"available": -1}},
+        {"$limit": limit}
+    ]).to_list(limit)
+    return {row["hotel_id"]: row["available"] for row in rows}
+
+async def _take(db, hotel_id: str, room_type: str, start: int, end: int, rooms: int, session=None) -> bool:
+    if rooms < 1:
+        raise ValueError("Book at least one room")
+    result = await db.hotel_calendars.update_one(
+        {"_id": calendar_id(hotel_id, room_type), **{f"nights.{i}": {"$gte": rooms} for i in range(start, end)}},
+        {"$inc": {f"nights.{i}": -rooms for i in range(start, end)}},
+        session=session
+    )
+    return result.modified_count == 1
+
+async def _give(db, hotel_id: str, room_type: str, start: int, end: int, rooms: int, session=None):
+    await db.hotel_calendars.update_one(
+        {"_id": calendar_id(hotel_id, room_type)},
+        {"$inc": {f"nights.{i}": rooms for i in range(start, end)}},
+        session=session
+    )
+
+async def reserve(db, hotel_id: str, room_type: str, check_in: datetime, nights: int, rooms: int = 1,
+                  session=None) -> bool:
+    """Take `rooms` on every night of the stay in one atomic update, or nothing if any night is short."""
+    start, length = _range(check_in, nights)
+    return await _take(db, hotel_id, room_type, start, start + length, rooms, session)
+
+def _remaining_window(hotel: dict):
+    # Nights of the listing window from today on; past nights are no longer sellable
+    start = max(night_index(hotel["check_in_date"]), night_index(datetime.utcnow()))
+    end = min(night_index(hotel["check_out_date"]), calendar_length())
+    return start, end
+
+async def hold_window(db, hotel: dict, rooms: int = 1, session=None) -> bool:
+    """Undated booking: take `rooms` on every remaining night of the hotel's listing window."""
+    start, end = _remaining_window(hotel)
+    if start >= end:
+        return True
+    return await _take(db, str(hotel["_id"]), hotel["room_type"], start, end, rooms, session)
+
+async def release_window(db, hotel: dict, rooms: int = 1, session=None):
+    start, end = _remaining_window(hotel)
+    if start < end:
+        await _give(db, str(hotel["_id"]), hotel["room_type"], start, end, rooms, session)
+
+async def release(db, hotel_id: str, room_type: str, check_in: datetime, nights: int, rooms: int = 1):
+    start, length = _range(check_in, nights)
+    await _give(db, hotel_id, room_type, start, start + length, rooms)
+
+async def sync_calendar(db, hotel: dict):
+    """Rebuild a hotel's calendar after an edit, keeping the rooms held by its active dated bookings.
+
+    Undated bookings are already reflected in available_rooms, which the calendar is built from.
+    """
+    calendar = build_calendar(hotel)
+    nights = calendar["nights"]
+    async for booking in db.hotel_bookings.find({
+        "hotel_id": calendar["hotel_id"],
+        "status": {"$ne": "cancelled"},
+        "check_in_date": {"$ne": None},
+        "check_out_date": {"$ne": None}
+    }):
+        start = night_index(booking["check_in_date"])
+        for i in range(max(0, start), min(len(nights), start + stay_nights(booking["check_in_date"], booking["check_out_date"]))):
+            nights[i] = max(0, nights[i] - booking.get("rooms", 1))
+    # A changed room type changes the calendar id; drop the old one
+    await db.hotel_calendars.delete_many({"hotel_id": calendar["hotel_id"], "_id": {"$ne": calendar["_id"]}})
+    await db.hotel_calendars.replace_one({"_id": calendar["_id"]}, calendar, upsert=True)
+
+def stay_nights(check_in: datetime, check_out: datetime) -> int:
+    return (datetime(check_out.year, check_out.month, check_out.day) - datetime(check_in.year, check_in.month, check_in.day)).days
@@ -0,0 +1,59 @@
+from fastapi import Response
+from bson import ObjectId
+from enum import Enum
+import orjson
+
+# Fast path for read endpoints. Documents coming back from Mongo were
+# validated when they were written, so instead of spreading each one into a
+# dict and re-validating it through response_model, a per-model field list
+# is compiled once and documents are projected onto it and serialized by
+# orjson, which encodes datetimes natively. Returning a Response skips
+# FastAPI's response_model validation; keep response_model on the route so
+# the OpenAPI schema is unchanged.
+
+_MISSING = object()
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+class DocumentEncoder:
+    def __init__(self, model):
+        self.fields = []
+        for name, field in model.model_fields.items():
+            default = _MISSING if field.is_required() else field.get_default(call_default_factory=True)
+            if isinstance(default, Enum):
+                default = default.value
+            self.fields.append((name, default))
+        self.with_id = "id" in model.model_fields
+
+    def project(self, document: dict) -> dict:
+        item = {}
+        for name, default in self.fields:
+            value = document.get(name, default)
+            if value is not _MISSING:
+                item[name] = value
+        if self.with_id and "_id" in document:
+            item["id"] = str(document["_id"])
+        return item
+
+    def encode(self, document: dict) -> bytes:
+        return orjson.dumps(self.project(document), default=_default)
+
+    def encode_many(self, documents) -> bytes:
+        return orjson.dumps([self.project(document) for document in documents], default=_default)
+
+_encoders = {}
+
+def encoder_for(model) -> DocumentEncoder:
+    encoder = _encoders.get(model)
+    if encoder is None:
+        encoder = _encoders[model] = DocumentEncoder(model)
+    return encoder
+
+def document_response(model, document: dict) -> Response:
+    return Response(content=encoder_for(model).encode(document), media_type="application/json")
+
+def documents_response(model, documents) -> Response:
+    return Response(content=encoder_for(model).encode_many(documents), media_type="application/json")
@@ -0,0 +1,231 @@
+import bisect
+import logging
+import re
+
+# In-process inverted index over hotels. Every hotel gets a bit position;
+# amenities, city tokens, name tokens and star ratings map to int bitsets,
+# and prices are kept sorted for range lookups, so a query is a handful of
+# ANDs/ORs over Python ints. Built from Mongo at startup and kept current
+# from the hotels change stream.
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STARS = re.compile(r"\b([1-5])[\s-]*star")
+_STOPWORDS = {"a", "an", "and", "at", "for", "from", "in", "near", "of", "on", "or", "the", "to", "with"}
+
+def tokenize(text: str) -> list:
+    return [
+        token for token in _TOKEN.findall(text.lower())
+        if (len(token) > 1 or token.isdigit()) and token not in _STOPWORDS
+    ]
+
+def _within_one_edit(a: str, b: str) -> bool:
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = j = edits = 0
+    while i < len(a) and j < len(b):
+        if a[i] != b[j]:
+            edits += 1
+            if edits > 1:
+                return False
+            if len(a) == len(b):
+                i += 1
+            j += 1
+        else:
+            i += 1
+            j += 1
+    return edits + (len(b) - j) <= 1
+
+
+class _TokenIndex:
+    def __init__(self):
+        self.postings = {}
+        self.vocabulary = []
+
+    def add(self, token: str, bit: int):
+        if token not in self.postings:
+            self.postings[token] = 0
+            bisect.insort(self.vocabulary, token)
+        self.postings[token] |= bit
+
+    def discard(self, token: str, bit: int):
+        if token in self.postings:
+            self.postings[token] &= ~bit
+
+    def lookup(self, token: str) -> int:
+        """Exact match, else prefix match (3+ chars), else one-edit fuzzy match (4+ chars).
+
+        Fuzzy matching only considers tokens sharing the first letter, which
+        keeps it to a small slice of the sorted vocabulary.
+        """
+        if token in self.postings:
+            return self.postings[token]
+        mask = 0
+        if len(token) >= 3:
+            start = bisect.bisect_left(self.vocabulary, token)
+            for candidate in self.vocabulary[start:]:
+                if not candidate.startswith(token):
+                    break
+                mask |= self.postings[candidate]
+        if not mask and len(token) >= 4 and token.isalpha():
+            start = bisect.bisect_left(self.vocabulary, token[0])
+            end = bisect.bisect_left(self.vocabulary, chr(ord(token[0]) + 1))
+            for candidate in self.vocabulary[start:end]:
+                if _within_one_edit(token, candidate):
+                    mask |= self.postings[candidate]
+        return mask
+
+
+class HotelIndex:
+    def __init__(self):
+        self.ids = []
+        self.positions = {}
+        self.free = []
+        self.documents = {}
+        self.live = 0
+        self.amenities = _TokenIndex()
+        self.cities = _TokenIndex()
+        self.names = _TokenIndex()
+        self.stars = {}
+        self.prices = []
+
+    def __len__(self):
+        return len(self.positions)
+
+    def upsert(self, hotel: dict):
+        hotel_id = str(hotel["_id"])
+        if hotel_id in self.positions:
+            self.remove(hotel_id)
+        position = self.free.pop() if self.free else len(self.ids)
+        if position == len(self.ids):
+            self.ids.append(hotel_id)
+        else:
+            self.ids[position] = hotel_id
+        self.positions[hotel_id] = position
+        bit = 1 << position
+        self.live |= bit
+
+        entry = {
+            "amenities": [amenity.lower() for amenity in hotel.get("amenities", [])],
+            "city": tokenize(hotel["address"]["city"]),
+            "name": tokenize(hotel["name"]),
+            "star_rating": hotel["star_rating"],
+            "price": hotel["price_per_night"]
+        }
+        self.documents[hotel_id] = entry
+        for amenity in entry["amenities"]:
+            self.amenities.add(amenity, bit)
+        for token in entry["city"]:
+            self.cities.add(token, bit)
+        for token in entry["name"]:
+            self.names.add(token, bit)
+        self.stars[entry["star_rating"]] = self.stars.get(entry["star_rating"], 0) | bit
+        bisect.insort(self.prices, (entry["price"], position))
+
+    def remove(self, hotel_id: str):
+        position = self.positions.pop(hotel_id, None)
+        if position is None:
+            return
+        entry = self.documents.pop(hotel_id)
+        bit = 1 << position
+        self.live &= ~bit
+        for amenity in entry["amenities"]:
+            self.amenities.discard(amenity, bit)
+        for token in entry["city"]:
+            self.cities.discard(token, bit)
+        for token in entry["name"]:
+            self.names.discard(token, bit)
+        self.stars[entry["star_rating"]] &= ~bit
+        self.prices.pop(bisect.bisect_left(self.prices, (entry["price"], position)))
+        self.free.append(position)
+
+    def _price_mask(self, min_price=None, max_price=None) -> int:
+        lo = 0 if min_price is None else bisect.bisect_left(self.prices, (min_price, -1))
+        hi = len(self.prices) if max_price is None else bisect.bisect_right(self.prices, (max_price, float("inf")))
+        mask = 0
+        for _, position in self.prices[lo:hi]:
+            mask |= 1 << position
+        return mask
+
+    def search(self, text: str = "", amenities=None, city=None, min_stars: int = None,
+               max_stars: int = None, min_price: float = None, max_price: float = None,
+               limit: int = 20) -> list:
+        """Return ids of matching hotels, best first.
+
+        Amenities, city, star and price constraints are hard filters. Free text
+        contributes amenity and star filters where it names them, and a city
+        filter from tokens that exactly match an indexed city token (unless
+        `city` is given); prefix/fuzzy city and name-token matches only affect
+        ranking. `city` may be one name or a list of names (any of them), matched
+        exactly; a city with no indexed hotels matches nothing.
+        """
+        mask = self.live
+        name_masks = []
+
+        if text:
+            match = _STARS.search(text.lower())
+            if match and min_stars is None and max_stars is None:
+                min_stars = max_stars = int(match.group(1))
+            city_mask = 0
+            for token in tokenize(text):
+                if token in self.amenities.postings:
+                    mask &= self.amenities.postings[token]
+                    continue
+                if token in self.cities.postings:
+                    if not city:
+                        city_mask |= self.cities.postings[token]
+                    continue
+                # Near-miss city tokens ("chatt", "barishl") rank rather than filter
+                token_near = self.cities.lookup(token) if len(token) >= 3 else 0
+                token_name = self.names.lookup(token) if len(token) >= 3 else 0
+                if token_near or token_name:
+                    name_masks.append(token_near | token_name)
+            if city_mask:
+                mask &= city_mask
+
+        for amenity in amenities or []:
+            mask &= self.amenities.postings.get(amenity.lower(), 0)
+        if city:
+            city_mask = 0
+            for name in [city] if isinstance(city, str) else city:
+                name_mask = self.live
+                for token in tokenize(name):
+                    name_mask &= self.cities.postings.get(token, 0)
+                city_mask |= name_mask
+            mask &= city_mask
+        if min_stars is not None or max_stars is not None:
+            star_mask = 0
+            for rating, rating_mask in self.stars.items():
+                if (min_stars is None or rating >= min_stars) and (max_stars is None or rating <= max_stars):
+                    star_mask |= rating_mask
+            mask &= star_mask
+        if min_price is not None or max_price is not None:
+            mask &= self._price_mask(min_price, max_price)
+
+        candidates = []
+        while mask:
+            low = mask & -mask
+            position = low.bit_length() - 1
+            mask ^= low
+            hotel_id = self.ids[position]
+            entry = self.documents[hotel_id]
+            score = sum(1 for name_mask in name_masks if name_mask & low)
+            candidates.append((-score, -entry["star_rating"], entry["price"], hotel_id))
+        candidates.sort()
+        return [candidate[3] for candidate in candidates[:limit]]
+
+
+async def maintain_index(db, index: HotelIndex):
+    async for hotel in db.hotels.find():
+        index.upsert(hotel)
+    logger.info("Indexed %d hotels", len(index))
+
+    async with db.hotels.watch(full_document="updateLookup") as stream:
+        async for change in stream:
+            if change["operationType"] == "delete":
+                index.remove(str(change["documentKey"]["_id"]))
+            elif change.get("fullDocument"):
+                index.upsert(change["fullDocument"])
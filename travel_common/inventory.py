@@ -0,0 +1,123 @@
+import asyncio
+import random
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+# Sharded counters for hot inventory items. A flight or hotel with
+# `counter_shards` set keeps its availability split across that many
+# documents in `inventory_shards`, so concurrent bookings contend on
+# different documents instead of one write lock.
+
+STOCK_FIELDS = {"flights": "seats_available", "hotels": "available_rooms"}
+RECONCILE_INTERVAL_SECONDS = 5
+# Merge into the filter of any write to an item's own stock field, so it misses
+# once the item is sharded instead of landing on a count the reconciler overwrites
+UNSHARDED = {"counter_shards": {"$not": {"$gt": 0}}}
+
+def _shard_id(collection: str, item_id: str, shard: int) -> str:
+    return f"{collection}:{item_id}:{shard}"
+
+def _add(collection: str, item_id: str, shard: int, quantity: int) -> UpdateOne:
+    # Upserts, so stock released before enable_sharding has created the shard still counts
+    return UpdateOne(
+        {"_id": _shard_id(collection, item_id, shard)},
+        {"$inc": {"count": quantity}, "$setOnInsert": {"collection": collection, "item_id": item_id}},
+        upsert=True
+    )
+
+async def enable_sharding(db, collection: str, item_id: str, shards: int):
+    # Flag the item and read its stock in one step; from then on bookings allocate
+    # from the shards and UNSHARDED writes miss, so none is lost between the two
+    item = await db[collection].find_one_and_update(
+        {"_id": ObjectId(item_id), **UNSHARDED},
+        {"$set": {"counter_shards": shards}},
+        return_document=ReturnDocument.AFTER
+    )
+    if item is None:
+        # Missing, or already sharded
+        return await db[collection].find_one({"_id": ObjectId(item_id)})
+
+    base, extra = divmod(item[STOCK_FIELDS[collection]], shards)
+    await db.inventory_shards.bulk_write([
+        _add(collection, item_id, i, base + (1 if i < extra else 0)) for i in range(shards)
+    ])
+    return item
+
+async def allocate(db, collection: str, item_id: str, shards: int, quantity: int = 1, session=None) -> bool:
+    # Start from a random shard and fall back to the others until one has stock
+    order = random.sample(range(shards), shards)
+    for shard in order:
+        result = await db.inventory_shards.update_one(
+            {"_id": _shard_id(collection, item_id, shard), "count": {"$gte": quantity}},
+            {"$inc": {"count": -quantity}},
+            session=session
+        )
+        if result.modified_count:
+            return True
+    return False
+
+async def release(db, collection: str, item_id: str, shards: int, quantity: int = 1, session=None):
+    await db.inventory_shards.bulk_write(
+        [_add(collection, item_id, random.randrange(shards), quantity)], session=session
+    )
+
+async def restock(db, collection: str, item_id: str, quantity: int = 1, session=None):
+    """Give stock back to an item: to its own field if unsharded, else to its shards."""
+    returned = await db[collection].update_one(
+        {"_id": ObjectId(item_id), **UNSHARDED},
+        {"$inc": {STOCK_FIELDS[collection]: quantity}},
+        session=session
+    )
+    if returned.matched_count == 0:
+        item = await db[collection].find_one({"_id": ObjectId(item_id)}, {"counter_shards": 1}, session=session)
+        if item is not None:
+            await release(db, collection, item_id, item["counter_shards"], quantity, session)
+
+async def total_available(db, collection: str, item_id: str) -> int:
+    result = await db.inventory_shards.aggregate([
+        {"$match": {"collection": collection, "item_id": item_id}},
+        {"$group": {"_id": None, "total": {"$sum": "$count"}}}
+    ]).to_list(1)
+    return result[0]["total"] if result else 0
+
+async def reconcile(db, collection: str, item_id: str):
+    shards = await db.inventory_shards.find(
+        {"collection": collection, "item_id": item_id}
+    ).to_list(None)
+    total = sum(shard["count"] for shard in shards)
+
+    # Move stock from the fullest shard into drained ones so allocation
+    # keeps succeeding on the first try. Each move decrements conditionally
+    # before incrementing, so concurrent bookings never see oversold stock.
+    target = total // len(shards) if shards else 0
+    donors = sorted(shards, key=lambda shard: shard["count"], reverse=True)
+    for shard in shards:
+        if shard["count"] > 0 or target == 0:
+            continue
+        donor = donors[0]
+        amount = min(target, donor["count"] - target)
+        if amount <= 0:
+            break
+        taken = await db.inventory_shards.update_one(
+            {"_id": donor["_id"], "count": {"$gte": amount}},
+            {"$inc": {"count": -amount}}
+        )
+        if taken.modified_count:
+            await db.inventory_shards.update_one({"_id": shard["_id"]}, {"$inc": {"count": amount}})
+            donor["count"] -= amount
+            donors.sort(key=lambda shard: shard["count"], reverse=True)
+
+    # The item document carries the aggregate for list views and the agents.
+    # Shards are the source of truth: every booking path (demo_api and the
+    # agents' confirm_booking) must allocate from them, never from this field.
+    await db[collection].update_one(
+        {"_id": ObjectId(item_id)},
+        {"$set": {STOCK_FIELDS[collection]: total}}
+    )
+
+async def reconcile_forever(db):
+    while True:
+        for collection in STOCK_FIELDS:
+            async for item in db[collection].find({"counter_shards": {"$gt": 0}}, {"_id": 1}):
+                await reconcile(db, collection, str(item["_id"]))
+        await asyncio.sleep(RECONCILE_INTERVAL_SECONDS)
@@ -1,9 +1,11 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
 from enum import Enum
 
+# Flight, hotel and booking models shared by demo_api and the agents service
+
 class FlightStatus(str, Enum):
     scheduled = "scheduled"
     delayed = "delayed"
@@ -11,6 +13,7 @@ class FlightStatus(str, Enum):
 
 class BookingStatus(str, Enum):
     confirmed = "confirmed"
+    pending = "pending"
     cancelled = "cancelled"
 
 class Address(BaseModel):
@@ -28,7 +31,7 @@ class FlightBase(BaseModel):
     arrival_time: datetime
     price: float
     seats_available: int
-    cabin_class: str
+    cabin_class: str  # Economy, Business, First
     status: FlightStatus = FlightStatus.scheduled
 
 class FlightCreate(FlightBase):
@@ -45,12 +48,12 @@ class HotelBase(BaseModel):
     name: str
     address: Address
     star_rating: int
-    room_type: str
+    room_type: str  # Single, Double, Suite, etc.
     price_per_night: float
     available_rooms: int
     check_in_date: datetime
     check_out_date: datetime
-    amenities: List[str]
+    amenities: List[str]  # e.g., ["wifi", "pool", "gym"]
 
 class HotelCreate(HotelBase):
     pass
@@ -65,27 +68,31 @@ class Hotel(HotelBase):
 class BookingBase(BaseModel):
     user_id: str
     total_price: float
-    booking_date: datetime = datetime.utcnow()
+    booking_date: datetime
     status: BookingStatus = BookingStatus.confirmed
 
 class FlightBookingCreate(BookingBase):
     flight_id: str
     passenger_name: str
-    passenger_email: EmailStr
+    passenger_email: str
     seat_number: Optional[str] = None
 
 class HotelBookingCreate(BookingBase):
     hotel_id: str
     guest_name: str
-    guest_email: EmailStr
+    guest_email: str
     room_number: Optional[str] = None
+    # With both dates set, rooms are taken from the per-night calendar
+    check_in_date: Optional[datetime] = None
+    check_out_date: Optional[datetime] = None
+    rooms: int = Field(1, ge=1)
 
 class FlightBooking(BookingBase):
     id: str
     flight_id: str
     passenger_name: str
-    passenger_email: EmailStr
-    seat_number: Optional[str]
+    passenger_email: str
+    seat_number: Optional[str] = None
 
     class Config:
         arbitrary_types_allowed = True
@@ -95,10 +102,37 @@ class HotelBooking(BookingBase):
     id: str
     hotel_id: str
     guest_name: str
-    guest_email: EmailStr
-    room_number: Optional[str]
+    guest_email: str
+    room_number: Optional[str] = None
+    check_in_date: Optional[datetime] = None
+    check_out_date: Optional[datetime] = None
+    rooms: int = 1
 
     class Config:
         arbitrary_types_allowed = True
         json_encoders = {ObjectId: str}
 
+class RouteSummary(BaseModel):
+    departure_airport: str
+    arrival_airport: str
+    date: str
+    flight_id: str
+    flight_number: str
+    airline: str
+    price: float
+    departure_time: datetime
+    flights: int
+    seats_available: int
+
+class CitySummary(BaseModel):
+    city: str
+    band: str  # budget, mid, upscale, luxury
+    hotels: int
+    available_rooms: int
+    min_price: float
+    max_price: float
+    cheapest_hotel_id: str
+    cheapest_hotel: str
+
+class IdBatch(BaseModel):
+    ids: List[str]
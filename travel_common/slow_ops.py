@@ -0,0 +1,197 @@
+from pymongo import monitoring
+from datetime import datetime
+import asyncio
+import json
+import logging
+import os
+import threading
+
+# Mongo command monitoring shared by both services. Every read/write command
+# is reduced to a query shape (collection, command and filter with values
+# replaced by "?") and timed per shape. Commands over SLOW_OP_THRESHOLD_MS
+# are logged, and the first slow occurrence of each shape is explained so a
+# COLLSCAN winning plan is flagged next to its stats. With
+# SLOW_OP_EXPLAIN_ALL set, every new shape is explained regardless of
+# latency, which surfaces missing indexes on small dev/staging data sets.
+
+logger = logging.getLogger(__name__)
+
+SLOW_OP_THRESHOLD_MS = float(os.getenv("SLOW_OP_THRESHOLD_MS", "100"))
+SLOW_OP_EXPLAIN = os.getenv("SLOW_OP_EXPLAIN", "true").lower() == "true"
+SLOW_OP_EXPLAIN_ALL = os.getenv("SLOW_OP_EXPLAIN_ALL", "false").lower() == "true"
+SLOW_OP_MAX_SHAPES = int(os.getenv("SLOW_OP_MAX_SHAPES", "1000"))
+
+# Commands whose first document selects what to read or modify
+_FILTERS = {
+    "find": lambda command: command.get("filter", {}),
+    "count": lambda command: command.get("query", {}),
+    "distinct": lambda command: command.get("query", {}),
+    "findAndModify": lambda command: command.get("query", {}),
+    "aggregate": lambda command: next(
+        (stage["$match"] for stage in command.get("pipeline", [])[:1] if "$match" in stage), {}
+    ),
+    "update": lambda command: command["updates"][0].get("q", {}) if command.get("updates") else {},
+    "delete": lambda command: command["deletes"][0].get("q", {}) if command.get("deletes") else {},
+}
+
+# Session and transport fields the driver adds; explain rejects most of them
+_DRIVER_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+
+def _path(key: str) -> str:
+    # Array positions vary per call (e.g. calendar nights.<i>); collapse them like a positional
+    return ".".join("$" if part.isdigit() else part for part in key.split("."))
+
+def normalize(value):
+    """Replace literal values with "?" and array positions in paths with "$", keeping field names and operators."""
+    if isinstance(value, dict):
+        shape = {}
+        for key, item in value.items():
+            shape[_path(key)] = normalize(item)
+        return shape
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in value:
+            shape = normalize(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return "?"
+
+def query_shape(command_name: str, command: dict) -> str:
+    collection = command.get(command_name)
+    shape = {"filter": normalize(_FILTERS[command_name](command))}
+    if command.get("sort"):
+        shape["sort"] = list(command["sort"].keys())
+    return f"{collection}.{command_name} {json.dumps(shape, sort_keys=True, default=str)}"
+
+def _winning_plans(explain):
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == "winningPlan":
+                yield value
+            else:
+                yield from _winning_plans(value)
+    elif isinstance(explain, list):
+        for item in explain:
+            yield from _winning_plans(item)
+
+def _stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _stages(item)
+
+def summarize_plan(explain: dict) -> dict:
+    stages = [stage for plan in _winning_plans(explain) for stage in _stages(plan)]
+    return {
+        "stages": [stage["stage"] for stage in stages],
+        "indexes": sorted({stage["indexName"] for stage in stages if "indexName" in stage}),
+        "collscan": any(stage["stage"] == "COLLSCAN" for stage in stages)
+    }
+
+class SlowOpListener(monitoring.CommandListener):
+    def __init__(self, threshold_ms: float = SLOW_OP_THRESHOLD_MS):
+        self.threshold_ms = threshold_ms
+        self.client = None
+        self.loop = None
+        self.pending = {}
+        self.shapes = {}
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def bind(self, client):
+        """Enable explain capture; call from the event loop the client is used on."""
+        self.client = client
+        self.loop = asyncio.get_running_loop()
+
+    def started(self, event):
+        if event.command_name not in _FILTERS:
+            return
+        command = {key: value for key, value in event.command.items()
+                   if not key.startswith("$") and key not in _DRIVER_FIELDS}
+        try:
+            shape = query_shape(event.command_name, command)
+        except Exception:
+            return
+        self.pending[(event.connection_id, event.request_id)] = (shape, event.database_name, command)
+
+    def succeeded(self, event):
+        entry = self.pending.pop((event.connection_id, event.request_id), None)
+        if entry is not None:
+            self._record(*entry, event.duration_micros / 1000)
+
+    def failed(self, event):
+        self.pending.pop((event.connection_id, event.request_id), None)
+
+    def _record(self, shape: str, database: str, command: dict, duration_ms: float):
+        slow = duration_ms >= self.threshold_ms
+        with self.lock:
+            stats = self.shapes.get(shape)
+            if stats is None:
+                if len(self.shapes) >= SLOW_OP_MAX_SHAPES:
+                    # Fast new shapes aren't worth a slot; slow ones evict the coldest non-COLLSCAN shape
+                    evictable = [row for row in self.shapes.values() if not row["collscan"]]
+                    if not slow or not evictable:
+                        if not self.dropped:
+                            logger.warning("Slow-op shape table full (%d); new fast shapes are not tracked", SLOW_OP_MAX_SHAPES)
+                        self.dropped += 1
+                        return
+                    del self.shapes[min(evictable, key=lambda row: row["total_ms"])["shape"]]
+                stats = self.shapes[shape] = {
+                    "shape": shape, "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                    "slow_count": 0, "last_slow_at": None, "plan": None, "collscan": None
+                }
+                explain = SLOW_OP_EXPLAIN_ALL
+            else:
+                explain = False
+            stats["count"] += 1
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            if slow:
+                explain = explain or stats["slow_count"] == 0
+                stats["slow_count"] += 1
+                stats["last_slow_at"] = datetime.utcnow()
+
+        if slow:
+            logger.warning("Slow Mongo operation (%.1f ms): %s", duration_ms, shape)
+        if explain and SLOW_OP_EXPLAIN and self.loop is not None:
+            # Listeners may run on a driver worker thread; explain on the client's loop
+            self.loop.call_soon_threadsafe(
+                lambda: self.loop.create_task(self._explain(shape, database, command))
+            )
+
+    async def _explain(self, shape: str, database: str, command: dict):
+        try:
+            explain = await self.client[database].command({"explain": command, "verbosity": "queryPlanner"})
+        except Exception as e:
+            logger.warning("Could not explain %s: %s", shape, e)
+            return
+        plan = summarize_plan(explain)
+        with self.lock:
+            if shape in self.shapes:
+                self.shapes[shape]["plan"] = plan
+                self.shapes[shape]["collscan"] = plan["collscan"]
+        if plan["collscan"]:
+            logger.warning("COLLSCAN plan for %s", shape)
+
+    def report(self, collscan_only: bool = False) -> list:
+        """Per-shape stats, slowest total time first."""
+        with self.lock:
+            rows = [
+                {**stats, "total_ms": round(stats["total_ms"], 3), "max_ms": round(stats["max_ms"], 3),
+                 "avg_ms": round(stats["total_ms"] / stats["count"], 3)}
+                for stats in self.shapes.values()
+                if stats["collscan"] or not collscan_only
+            ]
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+    def reset(self):
+        with self.lock:
+            self.shapes.clear()
+            self.dropped = 0
+
+listener = SlowOpListener()
@@ -0,0 +1,21 @@
+import asyncio
+import logging
+
+# Long-running startup tasks (change-stream watchers, reconcilers). A bare
+# create_task keeps the exception inside the task until it is garbage
+# collected; log it as soon as the task dies instead.
+
+logger = logging.getLogger(__name__)
+
+_tasks = set()
+
+def _finished(task: asyncio.Task):
+    _tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Background task %s stopped", task.get_name(), exc_info=task.exception())
+
+def start_background(coro, name: str) -> asyncio.Task:
+    task = asyncio.create_task(coro, name=name)
+    _tasks.add(task)
+    task.add_done_callback(_finished)
+    return task